@@ -0,0 +1,177 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from bisect import bisect_left, insort
+from collections import defaultdict, deque
+from itertools import islice
+from pretix.base.models import (
+    Event,
+    Order,
+    OrderPosition,
+    Seat,
+    SeatCategoryMapping,
+    SeatingPlan,
+)
+
+from .importer import Assignment, AssignmentDiff, SeatChange
+from .layout import get_layout
+from .profiling import add_rows
+
+
+class AllocationResult(NamedTuple):
+    assignments: List[Assignment]
+    unassigned: List[int]
+
+    def as_diff(self) -> AssignmentDiff:
+        return AssignmentDiff(
+            [
+                SeatChange(a.position_id, a.order_id, None, a.seat_id)
+                for a in self.assignments
+            ],
+            0,
+        )
+
+
+class SeatRuns:
+    """
+    Blocks of adjacent free seats within a row, indexed by their length so
+    that the smallest block fitting a group can be found by bisection.
+    """
+
+    def __init__(self, runs: List[List[int]]):
+        self.by_length: Dict[int, deque] = defaultdict(deque)
+        self.lengths: List[int] = []
+        for run in runs:
+            self._add(run, left=False)
+
+    def _add(self, run: List[int], left: bool = True):
+        if not run:
+            return
+        if not self.by_length[len(run)]:
+            insort(self.lengths, len(run))
+        if left:
+            self.by_length[len(run)].appendleft(run)
+        else:
+            self.by_length[len(run)].append(run)
+
+    def _pop(self, index: int) -> List[int]:
+        length = self.lengths[index]
+        run = self.by_length[length].popleft()
+        if not self.by_length[length]:
+            del self.lengths[index]
+        return run
+
+    def take_adjacent(self, size: int) -> Optional[List[int]]:
+        """
+        Takes ``size`` adjacent seats from the smallest block that is large
+        enough, or returns ``None`` if there is no such block.
+        """
+        index = bisect_left(self.lengths, size)
+        if index == len(self.lengths):
+            return None
+        run = self._pop(index)
+        self._add(run[size:])
+        return run[:size]
+
+    def take_any(self, size: int) -> List[int]:
+        """
+        Takes up to ``size`` seats from the largest blocks, keeping the group
+        in as few rows as possible.
+        """
+        seats = []
+        while self.lengths and len(seats) < size:
+            run = self._pop(len(self.lengths) - 1)
+            missing = size - len(seats)
+            seats += run[:missing]
+            self._add(run[missing:])
+        return seats
+
+
+class SeatAllocator:
+    """
+    Proposes seats for all order positions of an event that do not have one
+    yet. Positions are grouped by order and product, and every group is
+    placed in adjacent seats of one row of a layout category mapped to its
+    product if possible. Larger groups are placed first and always into the
+    smallest block of free seats they fit into.
+
+    Adjacency is taken from the order of seats within the rows of the layout,
+    so the run time is dominated by sorting and stays close to linear in the
+    number of seats and positions.
+    """
+
+    def __init__(self, event: Event, plan: SeatingPlan):
+        self.event = event
+        self.plan = plan
+
+    def free_seats(self) -> Dict[str, int]:
+        return dict(
+            Seat.annotated(
+                Seat.objects.filter(
+                    event=self.event, subevent__isnull=True, blocked=False
+                ),
+                self.event.pk,
+                None,
+            )
+            .filter(has_order=False, has_cart=False, has_voucher=False)
+            .values_list("seat_guid", "pk")
+        )
+
+    def runs_by_category(self) -> Dict[str, SeatRuns]:
+        free = self.free_seats()
+        runs = defaultdict(list)
+        for row in get_layout(self.plan).rows:
+            current = None
+            for seat in row:
+                seat_id = free.get(seat.guid)
+                if current is None or seat_id is None or seat.category != current[0]:
+                    current = (seat.category, [])
+                    runs[seat.category].append(current[1])
+                if seat_id is not None:
+                    current[1].append(seat_id)
+        return {category: SeatRuns(r) for category, r in runs.items()}
+
+    def groups(self, product_ids: Iterable[int]) -> List[List[OrderPosition]]:
+        positions = (
+            OrderPosition.objects.filter(
+                order__event=self.event,
+                order__status__in=(Order.STATUS_PENDING, Order.STATUS_PAID),
+                seat__isnull=True,
+                item_id__in=product_ids,
+            )
+            .order_by("order_id", "positionid")
+            .only("pk", "order_id", "item_id")
+        )
+        groups = defaultdict(list)
+        for position in positions:
+            groups[position.order_id, position.item_id].append(position)
+        return sorted(groups.values(), key=len, reverse=True)
+
+    def allocate(self) -> AllocationResult:
+        runs = self.runs_by_category()
+        categories = defaultdict(list)
+        for product_id, category in (
+            SeatCategoryMapping.objects.filter(event=self.event, subevent__isnull=True)
+            .order_by("pk")
+            .values_list("product_id", "layout_category")
+        ):
+            categories[product_id].append(category)
+
+        assignments = []
+        unassigned = []
+        for group in self.groups(list(categories)):
+            candidates = [runs[c] for c in categories[group[0].item_id] if c in runs]
+            seats = None
+            for candidate in candidates:
+                seats = candidate.take_adjacent(len(group))
+                if seats:
+                    break
+            if not seats:
+                seats = []
+                for candidate in candidates:
+                    seats += candidate.take_any(len(group) - len(seats))
+            for position, seat_id in zip(group, seats):
+                assignments.append(Assignment(position.pk, position.order_id, seat_id))
+            unassigned += [p.pk for p in islice(group, len(seats), None)]
+
+        add_rows(len(assignments) + len(unassigned))
+        return AllocationResult(assignments, unassigned)
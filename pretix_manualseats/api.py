@@ -0,0 +1,153 @@
+import json
+from django.db import transaction
+from pretix.base.models import OrderPosition
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, PermissionDenied, ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.response import Response
+
+from .importer import (
+    ACTIVE,
+    LOOKUP_BATCH_SIZE,
+    AssignmentOperation,
+    SeatAssignmentImporter,
+)
+
+OPERATIONS = ("upsert", "delete")
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON, one operation per line, into a list.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        operations = []
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                operations.append(json.loads(line))
+            except ValueError as e:
+                raise ParseError("Line {} is not valid JSON: {}".format(number, e))
+        return operations
+
+
+class AssignmentPagination(CursorPagination):
+    ordering = "pk"
+    page_size = 500
+    page_size_query_param = "page_size"
+    max_page_size = LOOKUP_BATCH_SIZE
+
+
+class SeatAssignmentViewSet(viewsets.GenericViewSet):
+    """
+    Lists the seat assignments of an event and changes them in batches.
+
+    A batch is either a JSON object with ``upsert`` and ``delete`` lists of
+    ``{"seat_guid": …, "secret": …}`` objects, or newline-delimited JSON with
+    one such object per line and an additional ``op`` key. Every batch is
+    applied in one transaction. If any operation fails, nothing is written
+    and the errors are returned with the index of the failed operation.
+    """
+
+    queryset = OrderPosition.all.none()
+    permission = "can_view_orders"
+    write_permission = "can_change_orders"
+    pagination_class = AssignmentPagination
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if "pretix_manualseats" not in request.event.get_plugins():
+            raise PermissionDenied("The plugin is not active for this event.")
+
+    def get_queryset(self):
+        return (
+            OrderPosition.objects.filter(
+                order__event=self.request.event,
+                order__status__in=ACTIVE,
+                seat__isnull=False,
+            )
+            .values("pk", "secret", "positionid", "seat__seat_guid", "order__code")
+            .order_by("pk")
+        )
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(
+            [
+                {
+                    "seat_guid": p["seat__seat_guid"],
+                    "secret": p["secret"],
+                    "order": p["order__code"],
+                    "positionid": p["positionid"],
+                }
+                for p in page
+            ]
+        )
+
+    def get_operations(self, data):
+        if isinstance(data, dict):
+            data = [dict(o, op=op) for op in OPERATIONS for o in data.get(op) or []]
+        if not isinstance(data, list):
+            raise ValidationError("Expected an object or a list of operations.")
+        if len(data) > LOOKUP_BATCH_SIZE:
+            raise ValidationError(
+                "A batch can not contain more than {} operations.".format(
+                    LOOKUP_BATCH_SIZE
+                )
+            )
+
+        operations = []
+        errors = []
+        for index, o in enumerate(data):
+            if (
+                not isinstance(o, dict)
+                or o.get("op") not in OPERATIONS
+                or not isinstance(o.get("seat_guid"), str)
+                or not isinstance(o.get("secret"), str)
+            ):
+                errors.append({"index": index, "error": "Invalid operation."})
+                continue
+            operations.append(
+                AssignmentOperation(index, o["op"], o["seat_guid"], o["secret"])
+            )
+        return operations, errors
+
+    @action(detail=False, methods=["POST"])
+    def batch(self, request, *args, **kwargs):
+        operations, errors = self.get_operations(request.data)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = SeatAssignmentImporter(
+            request.event, user=request.user, auth=request.auth
+        )
+        with transaction.atomic():
+            diff, errors = importer.resolve_operations(operations)
+            if errors:
+                return Response(
+                    {"errors": [{"index": i, "error": str(e)} for i, e in errors]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            conflicts = importer.apply(diff, atomic=True)
+            if conflicts:
+                transaction.set_rollback(True)
+                return Response(
+                    {"errors": [{"error": str(e)} for e in conflicts]},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+        return Response(
+            {
+                "added": diff.added,
+                "moved": diff.moved,
+                "removed": diff.removed,
+                "unchanged": diff.unchanged,
+            }
+        )
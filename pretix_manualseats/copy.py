@@ -0,0 +1,281 @@
+from typing import List, NamedTuple, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q, QuerySet
+from django.db.models.expressions import RawSQL
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+from django_scopes import scopes_disabled
+from pretix.base.models import (
+    CartPosition,
+    Event,
+    Order,
+    OrderPosition,
+    Seat,
+    SeatCategoryMapping,
+    Voucher,
+)
+from pretix.base.services.locking import lock_objects
+
+from .importer import WRITE_BATCH_SIZE, AssignmentLog, chunked
+from .occupancy import invalidate_occupancy
+from .seats import SeatSynchronizer
+
+# Fields identifying the same ticket holder in two events, as a label and the
+# lookup path from the position.
+POSITION_KEYS = {
+    "attendee_email": (_("Attendee email"), "attendee_email"),
+    "order_email": (_("Order email"), "order__email"),
+    "customer": (_("Customer account"), "order__customer_id"),
+}
+SAMPLE_SIZE = 20
+ACTIVE = (Order.STATUS_PENDING, Order.STATUS_PAID)
+
+
+class CopyResult(NamedTuple):
+    copied: int
+    # Assigned positions of the source event without a match in the target
+    unmatched: int
+    # Matched positions that already have a seat or whose seat is taken
+    skipped: int
+    # Order code, position id and seat guid of some unmatched positions
+    sample: List[Tuple[str, int, str]]
+    # Categories whose product does not exist in the target event
+    unmapped: List[str]
+
+
+def _sql(qs: QuerySet) -> Tuple[str, tuple]:
+    sql, params = qs.query.sql_with_params()
+    return sql, tuple(params)
+
+
+def copy_mapping(source: Event, target: Event) -> List[str]:
+    """
+    Replaces the category mapping of the target event by the one of the
+    source event. Products are matched by name. Returns the categories
+    whose product does not exist in the target event.
+    """
+    products = {
+        str(name): pk
+        for pk, name in target.items.order_by("-pk").values_list("pk", "name")
+    }
+    mappings = []
+    unmapped = []
+    for category, product in (
+        SeatCategoryMapping.objects.filter(event=source, subevent__isnull=True)
+        .order_by("pk")
+        .values_list("layout_category", "product__name")
+    ):
+        if str(product) in products:
+            mappings.append(
+                SeatCategoryMapping(
+                    event=target,
+                    layout_category=category,
+                    product_id=products[str(product)],
+                )
+            )
+        else:
+            unmapped.append(category)
+
+    SeatCategoryMapping.objects.filter(event=target, subevent__isnull=True).delete()
+    SeatCategoryMapping.objects.bulk_create(mappings)
+    return unmapped
+
+
+class AssignmentCopier:
+    """
+    Copies the category mapping and the seat assignments of an event to
+    another event using the same seating plan, e.g. the next performance of
+    a show with season tickets. Positions are matched by one of
+    :data:`POSITION_KEYS`, which needs to be unique within both events, and
+    seats by their guid.
+
+    The matching is done in the database by joining the keys of both events
+    and the seats of the target event, and the seats are written with a
+    single ``UPDATE ... FROM`` statement. Apart from the ids of the changed
+    positions, which are recorded in the logs of their orders, nothing is
+    loaded into Python. Only positions without a seat are changed.
+    """
+
+    def __init__(self, source: Event, target: Event, key: str, user=None, auth=None):
+        if source.seating_plan_id != target.seating_plan_id:
+            raise ValueError("The events do not use the same seating plan.")
+        self.source = source
+        self.target = target
+        self.user = user
+        self.auth = auth
+        self.label, self.path = POSITION_KEYS[key]
+
+    def keyed(self, event: Event) -> QuerySet:
+        """
+        Active positions of an event annotated with their key, if it is set.
+        """
+        qs = (
+            OrderPosition.objects.filter(order__event=event, order__status__in=ACTIVE)
+            .annotate(copy_key=F(self.path))
+            .filter(copy_key__isnull=False)
+        )
+        if self.path != "order__customer_id":
+            qs = qs.exclude(copy_key="")
+        return qs.order_by().values("copy_key").annotate(n=Count("pk")).filter(n=1)
+
+    def matches(self, available: bool = False) -> Tuple[str, tuple]:
+        """
+        SQL selecting every target position whose key is unique in both
+        events and whose counterpart in the source event has a seat, with the
+        seat of the target event it gets. With ``available``, seats that are
+        sold, in a cart or reserved by a voucher are left out.
+        """
+        with scopes_disabled():
+            # Keys are grouped to find the unique ones, so the aggregates are
+            # the values of the only position with the key. Every part is
+            # aggregated, which makes databases build each of them once and
+            # join them by hash or index instead of looking up rows per match.
+            source = (
+                self.keyed(self.source)
+                .annotate(guid=Max("seat__seat_guid"))
+                .filter(guid__isnull=False)
+                .values("copy_key", "guid")
+            )
+            target = self.keyed(self.target).annotate(
+                position=Max("pk"),
+                position_order=Max("order_id"),
+                current_seat=Max("seat_id"),
+            )
+            seats = Seat.objects.filter(event=self.target, subevent__isnull=True)
+            if available:
+                seats = (
+                    seats.exclude(
+                        Exists(
+                            OrderPosition.objects.filter(
+                                seat=OuterRef("pk"), order__status__in=ACTIVE
+                            )
+                        )
+                    )
+                    .exclude(
+                        Exists(
+                            CartPosition.objects.filter(
+                                seat=OuterRef("pk"), expires__gte=now()
+                            )
+                        )
+                    )
+                    .exclude(
+                        Exists(
+                            Voucher.objects.filter(
+                                Q(valid_until__isnull=True) | Q(valid_until__gte=now()),
+                                seat=OuterRef("pk"),
+                                redeemed__lt=F("max_usages"),
+                            )
+                        )
+                    )
+                )
+            seats = (
+                seats.order_by()
+                .values(guid=F("seat_guid"))
+                .annotate(new_seat=Min("pk"))
+                .values("guid", "new_seat")
+            )
+
+        target_sql, target_params = _sql(
+            target.values("copy_key", "position", "position_order", "current_seat")
+        )
+        source_sql, source_params = _sql(source)
+        seats_sql, seats_params = _sql(seats)
+        return (
+            "SELECT t.copy_key, t.position, t.position_order, t.current_seat, "
+            "s.new_seat FROM ({}) t "
+            "INNER JOIN ({}) k ON k.copy_key = t.copy_key "
+            "INNER JOIN ({}) s ON s.guid = k.guid".format(
+                target_sql, source_sql, seats_sql
+            ),
+            target_params + source_params + seats_params,
+        )
+
+    def copy_mapping(self) -> List[str]:
+        unmapped = copy_mapping(self.source, self.target)
+        # Seats take their product from the mapping
+        SeatSynchronizer(self.target, self.target.seating_plan).run()
+        return unmapped
+
+    def copy_assignments(self) -> Tuple[int, int]:
+        """
+        Assigns the seats in one UPDATE statement. Returns the number of
+        positions that got a seat and the number of matched positions that
+        were skipped, since they already have a seat or their seat is taken.
+        """
+        # All seats of the event may change, so it is locked as a whole like
+        # the checkout does for events with a minimal seat distance.
+        lock_objects([self.target])
+        matches, params = self.matches()
+        eligible, eligible_params = self.matches(available=True)
+        eligible += " WHERE t.current_seat IS NULL"
+
+        Order.objects.filter(
+            pk__in=RawSQL(
+                "SELECT m.position_order FROM ({}) m".format(eligible),
+                eligible_params,
+            )
+        ).update(last_modified=now())
+        table = connection.ops.quote_name(OrderPosition._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM ({}) m".format(matches),
+                params,
+            )
+            matched = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT m.position, m.position_order, m.new_seat FROM ({}) m".format(
+                    eligible
+                ),
+                eligible_params,
+            )
+            changes = cursor.fetchall()
+            cursor.execute(
+                "UPDATE {table} SET seat_id = m.new_seat FROM ({eligible}) m "
+                "WHERE {table}.id = m.position".format(table=table, eligible=eligible),
+                eligible_params,
+            )
+            copied = cursor.rowcount
+
+        log = AssignmentLog(self.target, self.user, self.auth)
+        for batch in chunked(changes, WRITE_BATCH_SIZE):
+            for position_id, order_id, seat_id in batch:
+                log.add(position_id, order_id, None, seat_id)
+            log.write()
+        return copied, matched - copied
+
+    def unmatched(self) -> Tuple[int, List[Tuple[str, int, str]]]:
+        """
+        Counts the assigned positions of the source event that have no
+        match in the target event and returns a sample of them.
+        """
+        matches, params = self.matches()
+        with scopes_disabled():
+            unmatched = (
+                OrderPosition.objects.filter(
+                    order__event=self.source,
+                    order__status__in=ACTIVE,
+                    seat__isnull=False,
+                )
+                .annotate(copy_key=F(self.path))
+                .exclude(
+                    copy_key__in=RawSQL(
+                        "SELECT m.copy_key FROM ({}) m".format(matches), params
+                    )
+                )
+            )
+            sample = unmatched.order_by("order__code", "positionid").values_list(
+                "order__code", "positionid", "seat__seat_guid"
+            )[:SAMPLE_SIZE]
+            return unmatched.count(), list(sample)
+
+    @transaction.atomic
+    def run(self, mapping: bool = True, assignments: bool = True) -> CopyResult:
+        unmapped = self.copy_mapping() if mapping else []
+        copied = skipped = unmatched = 0
+        sample = []
+        if assignments:
+            copied, skipped = self.copy_assignments()
+            unmatched, sample = self.unmatched()
+            invalidate_occupancy(self.target)
+        return CopyResult(copied, unmatched, skipped, sample, unmapped)
@@ -0,0 +1,67 @@
+from django.utils.translation import gettext as _, gettext_lazy, pgettext_lazy
+from pretix.base.exporter import ListExporter
+from pretix.base.models import OrderPosition
+
+from .importer import ACTIVE, POSITION_COLUMN, SEAT_COLUMN
+from .layout import get_layout
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class SeatAssignmentExporter(ListExporter):
+    identifier = "manualseats_assignments"
+    verbose_name = gettext_lazy("Seat assignments")
+    category = pgettext_lazy("export_category", "Order data")
+    description = gettext_lazy(
+        "Download a spreadsheet of all assigned seats. The file can be uploaded "
+        "again on the seat assignment page."
+    )
+    repeatable_read = False
+
+    def get_filename(self):
+        return "{}_seats".format(self.event.slug)
+
+    def iterate_list(self, form_data):
+        yield [
+            SEAT_COLUMN,
+            POSITION_COLUMN,
+            _("Zone"),
+            _("Row"),
+            _("Seat number"),
+            _("Category"),
+            _("Product"),
+            _("Order code"),
+            _("Attendee name"),
+        ]
+
+        qs = OrderPosition.objects.filter(
+            order__event=self.event, order__status__in=ACTIVE, seat__isnull=False
+        ).order_by("seat__sorting_rank", "seat__seat_guid")
+        yield self.ProgressSetTotal(total=qs.count())
+
+        plan = self.event.seating_plan
+        seats = get_layout(plan).by_guid if plan else {}
+        products = {i.pk: str(i.name) for i in self.event.items.all()}
+
+        for row in qs.values_list(
+            "seat__seat_guid",
+            "secret",
+            "seat__zone_name",
+            "seat__row_name",
+            "seat__seat_number",
+            "item_id",
+            "order__code",
+            "attendee_name_cached",
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            guid, secret, zone, row_name, number, item_id, code, name = row
+            yield [
+                guid,
+                secret,
+                zone,
+                row_name,
+                number,
+                seats[guid].category if guid in seats else "",
+                products.get(item_id, ""),
+                code,
+                name or "",
+            ]
@@ -0,0 +1,1028 @@
+from typing import (
+    IO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TextIO,
+    Tuple,
+)
+
+import csv
+import io
+from collections import defaultdict
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy as _
+from itertools import islice
+from pretix.base.models import (
+    CartPosition,
+    Event,
+    LogEntry,
+    Order,
+    OrderPosition,
+    Seat,
+    SeatCategoryMapping,
+    Voucher,
+)
+from pretix.base.services.locking import LockTimeoutException, lock_objects
+
+from .layout import get_layout
+from .occupancy import invalidate_occupancy
+from .profiling import add_rows
+
+HEADER = "seat_guid,orderposition_secret"
+ERROR_REPORT = "assignment-errors.csv"
+CONFLICT_REPORT = "assignment-conflicts.csv"
+SEAT_COLUMN = "seat_guid"
+POSITION_COLUMN = "orderposition_secret"
+ZONE_COLUMN = "zone"
+ROW_COLUMN = "row"
+NUMBER_COLUMN = "seat_number"
+ORDER_COLUMN = "order_code"
+POSITIONID_COLUMN = "positionid"
+EMAIL_COLUMN = "attendee_email"
+# Accepted column sets identifying a seat and an order position, in order of
+# preference. The first set of each is the canonical format.
+SEAT_COLUMNS = ((SEAT_COLUMN,), (ZONE_COLUMN, ROW_COLUMN, NUMBER_COLUMN))
+POSITION_COLUMNS = (
+    (POSITION_COLUMN,),
+    (ORDER_COLUMN, POSITIONID_COLUMN),
+    (EMAIL_COLUMN,),
+)
+
+# Upper bound for the number of values in a single ``__in`` lookup. Keeps us
+# well below the parameter limits of all supported database backends. Rows
+# are also fed to the importer in chunks of this size.
+LOOKUP_BATCH_SIZE = 5000
+WRITE_BATCH_SIZE = 1000
+# Changes are written in chunks of this size, each in a short transaction of
+# its own, so seats are only locked for a moment while sales go on.
+LOCK_BATCH_SIZE = 100
+SAMPLE_SIZE = 20
+# Orders whose positions hold their seats, positions of canceled or expired
+# orders keep the seat id but pretix treats the seat as free
+ACTIVE = (Order.STATUS_PENDING, Order.STATUS_PAID)
+# Order log entry pretix writes when the seat of a position is changed
+SEAT_CHANGED_ACTION = "pretix.event.order.changed.seat"
+# Events with more assignments than this can not be edited in the textarea.
+INLINE_ROW_LIMIT = 1000
+# Uploads with more rows than this are imported in a background task.
+ASYNC_ROW_THRESHOLD = 10000
+
+
+class AssignmentRow(NamedTuple):
+    """
+    A row of an assignment file. Seats and positions are either given by
+    ``seat_guid`` and ``orderposition_secret`` or, if the file uses one of
+    the alternative column sets, by ``seat_label`` and ``position_label``.
+    """
+
+    line: int
+    seat_guid: str
+    orderposition_secret: str
+    seat_label: Optional[Tuple[str, ...]] = None
+    position_label: Optional[Tuple[str, ...]] = None
+
+    @property
+    def is_valid(self) -> bool:
+        return bool(
+            (self.seat_guid or (self.seat_label and all(self.seat_label)))
+            and (
+                self.orderposition_secret
+                or (self.position_label and all(self.position_label))
+            )
+        )
+
+
+class Assignment(NamedTuple):
+    position_id: int
+    order_id: int
+    seat_id: int
+
+
+def chunked(values: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(values)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def open_upload(fileobj: IO[bytes]) -> TextIO:
+    """
+    Wraps an uploaded binary file for :func:`read_rows`. A leading byte order
+    mark is dropped and line endings are left to the CSV reader.
+    """
+    return io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+
+
+def count_rows(fileobj: IO[bytes], blocksize: int = 1024 * 1024) -> int:
+    """
+    Returns the number of lines of a binary file without the header, reading
+    it in blocks. Used to estimate the progress of a running import.
+    """
+    lines = 0
+    last = b""
+    for block in iter(lambda: fileobj.read(blocksize), b""):
+        lines += block.count(b"\n")
+        last = block
+    if last and not last.endswith(b"\n"):
+        lines += 1
+    fileobj.seek(0)
+    return max(lines - 1, 0)
+
+
+def _find_columns(
+    header: List[str], choices: Tuple[Tuple[str, ...], ...]
+) -> Tuple[Optional[Tuple[str, ...]], Tuple[int, ...]]:
+    for names in choices:
+        if all(n in header for n in names):
+            return names, tuple(header.index(n) for n in names)
+    return None, ()
+
+
+def read_rows(lines: Iterable[str]) -> Iterator[AssignmentRow]:
+    """
+    Reads assignment rows from an iterable of CSV lines, e.g. an open text
+    file, one row at a time. The first non-empty row is the header. It needs
+    to contain either a ``seat_guid`` column or the ``zone``, ``row`` and
+    ``seat_number`` columns, and either an ``orderposition_secret`` column,
+    the ``order_code`` and ``positionid`` columns or an ``attendee_email``
+    column. Other columns are ignored. Rows lacking one of the values are
+    returned with empty fields and reported by the importer.
+    """
+    reader = csv.reader(lines)
+    header = None
+    try:
+        for record in reader:
+            cells = [c.strip() for c in record]
+            if not any(cells):
+                continue
+            if header is None:
+                cells[0] = cells[0].lstrip("\ufeff")
+                seat_names, seat_columns = _find_columns(cells, SEAT_COLUMNS)
+                position_names, position_columns = _find_columns(
+                    cells, POSITION_COLUMNS
+                )
+                if seat_names is None or position_names is None:
+                    raise ValidationError(
+                        _(
+                            "The CSV input format is invalid. Please check if you have included the headers."
+                        )
+                    )
+                header = cells
+                continue
+            seat = tuple(cells[i] if i < len(cells) else "" for i in seat_columns)
+            position = tuple(
+                cells[i] if i < len(cells) else "" for i in position_columns
+            )
+            seat_by_guid = seat_names == SEAT_COLUMNS[0]
+            position_by_secret = position_names == POSITION_COLUMNS[0]
+            yield AssignmentRow(
+                reader.line_num,
+                seat[0] if seat_by_guid else "",
+                position[0] if position_by_secret else "",
+                None if seat_by_guid else seat,
+                None if position_by_secret else position,
+            )
+    except csv.Error as e:
+        raise ValidationError(
+            _("Line {line} could not be parsed ({error}).").format(
+                line=reader.line_num, error=e
+            )
+        )
+
+
+class AssignmentOperation(NamedTuple):
+    """
+    A single change requested through the API: ``upsert`` assigns the seat
+    to the position, ``delete`` removes it from the position.
+    """
+
+    index: int
+    op: str
+    seat_guid: str
+    orderposition_secret: str
+
+
+class SeatChange(NamedTuple):
+    position_id: int
+    order_id: int
+    old_seat_id: Optional[int]
+    new_seat_id: Optional[int]
+
+    @property
+    def kind(self) -> str:
+        if self.old_seat_id is None:
+            return "added"
+        if self.new_seat_id is None:
+            return "removed"
+        return "moved"
+
+
+class AssignmentLog:
+    """
+    Records seat changes in the logs of their orders, with the same entries
+    pretix writes when a seat is changed through the order, including their
+    notifications and webhooks. Changes are collected and written by
+    :meth:`write` with a fixed number of queries, which is meant to be called
+    once per batch in the transaction that changes the seats.
+    """
+
+    def __init__(self, event: Event, user=None, auth=None):
+        self.event = event
+        self.user = user
+        self.auth = auth
+        self.changes: List[SeatChange] = []
+
+    def add(
+        self,
+        position_id: int,
+        order_id: int,
+        old_seat_id: Optional[int],
+        new_seat_id: Optional[int],
+    ):
+        if old_seat_id != new_seat_id:
+            self.changes.append(
+                SeatChange(position_id, order_id, old_seat_id, new_seat_id)
+            )
+
+    def write(self):
+        changes, self.changes = self.changes, []
+        if not changes:
+            return
+        positionids = dict(
+            OrderPosition.all.filter(
+                pk__in=[c.position_id for c in changes]
+            ).values_list("pk", "positionid")
+        )
+        seats = Seat.objects.only(
+            "seat_guid",
+            "zone_name",
+            "row_name",
+            "row_label",
+            "seat_number",
+            "seat_label",
+        ).in_bulk(
+            ({c.old_seat_id for c in changes} | {c.new_seat_id for c in changes})
+            - {None}
+        )
+        entries = []
+        for c in changes:
+            old_seat = seats.get(c.old_seat_id)
+            new_seat = seats.get(c.new_seat_id)
+            entries.append(
+                Order(pk=c.order_id, event=self.event).log_action(
+                    SEAT_CHANGED_ACTION,
+                    user=self.user,
+                    auth=self.auth,
+                    data={
+                        "position": c.position_id,
+                        "positionid": positionids.get(c.position_id),
+                        "old_seat": old_seat.name if old_seat else "-",
+                        "new_seat": new_seat.name if new_seat else "-",
+                        "old_seat_id": c.old_seat_id,
+                        "new_seat_id": c.new_seat_id,
+                    },
+                    save=False,
+                )
+            )
+        LogEntry.bulk_create_and_postprocess(entries)
+
+
+class SeatConflict(NamedTuple):
+    """
+    A change that was skipped because the position or seat changed after
+    the diff was computed, e.g. by a concurrent checkout.
+    """
+
+    position_id: int
+    seat_id: Optional[int]
+    # "changed": the position's seat is not the one the diff started from
+    # "taken": the seat is held by another order, cart or voucher
+    # "unseated": like "taken", and the previous seat is gone as well
+    # "locked": the seats could not be locked in time
+    # "locked_unseated": like "locked", and the previous seat is gone as well
+    reason: str
+
+
+class ChangePreview(NamedTuple):
+    position: OrderPosition
+    old_seat: Optional[Seat]
+    new_seat: Optional[Seat]
+
+
+class AssignmentDiff:
+    def __init__(self, changes: List[SeatChange], unchanged: int):
+        self.changes = changes
+        self.unchanged = unchanged
+
+    def count(self, kind: str) -> int:
+        return sum(1 for c in self.changes if c.kind == kind)
+
+    @property
+    def added(self) -> int:
+        return self.count("added")
+
+    @property
+    def moved(self) -> int:
+        return self.count("moved")
+
+    @property
+    def removed(self) -> int:
+        return self.count("removed")
+
+    @cached_property
+    def sample(self) -> List[ChangePreview]:
+        changes = self.changes[:SAMPLE_SIZE]
+        positions = OrderPosition.all.select_related("order").in_bulk(
+            [c.position_id for c in changes]
+        )
+        seats = Seat.objects.in_bulk(
+            ({c.old_seat_id for c in changes} | {c.new_seat_id for c in changes})
+            - {None}
+        )
+        return [
+            ChangePreview(
+                positions[c.position_id],
+                seats.get(c.old_seat_id),
+                seats.get(c.new_seat_id),
+            )
+            for c in changes
+        ]
+
+
+class SeatAssignmentImporter:
+    """
+    Assigns seats to order positions of an event from a stream of
+    :class:`AssignmentRow`. Rows are resolved in chunks with a fixed number
+    of queries per chunk and every row is checked before anything is written.
+    Besides the ids of matched seats and positions, only the seat guids and
+    secrets of all rows are kept in memory to find duplicates.
+
+    The import describes the complete set of assignments of the event: it is
+    diffed against the current state, and only positions that gain, change or
+    lose their seat are written.
+    """
+
+    def __init__(
+        self,
+        event: Event,
+        progress: Optional[Callable[[int, int], None]] = None,
+        user=None,
+        auth=None,
+    ):
+        self.event = event
+        self.progress = progress
+        self.user = user
+        self.auth = auth
+        self.log = AssignmentLog(event, user, auth)
+
+    @cached_property
+    def product_categories(self) -> Dict[int, Set[str]]:
+        """
+        The layout categories every mapped product may be seated in.
+        """
+        categories = defaultdict(set)
+        for category, product_id in SeatCategoryMapping.objects.filter(
+            event=self.event, subevent__isnull=True
+        ).values_list("layout_category", "product_id"):
+            categories[product_id].add(category)
+        return categories
+
+    @cached_property
+    def seat_labels(self) -> Dict[Tuple[str, ...], Optional[str]]:
+        """
+        Index of seat guids by zone, row and seat number, built from the
+        layout. Labels shared by several seats map to ``None``.
+        """
+        index: Dict[Tuple[str, ...], Optional[str]] = {}
+        if self.event.seating_plan:
+            for seat in get_layout(self.event.seating_plan).seats:
+                key = (seat.zone, seat.row, seat.number)
+                index[key] = None if key in index else seat.guid
+        return index
+
+    @cached_property
+    def position_codes(self) -> Dict[Tuple[str, int], str]:
+        """
+        Index of position secrets of active orders by order code and position
+        id.
+        """
+        return {
+            (code, positionid): secret
+            for code, positionid, secret in OrderPosition.objects.filter(
+                order__event=self.event, order__status__in=ACTIVE
+            ).values_list("order__code", "positionid", "secret")
+        }
+
+    @cached_property
+    def attendee_emails(self) -> Dict[str, Optional[str]]:
+        """
+        Index of position secrets of active orders by attendee email.
+        Addresses shared by several positions map to ``None``.
+        """
+        index: Dict[str, Optional[str]] = {}
+        for email, secret in (
+            OrderPosition.objects.filter(
+                order__event=self.event, order__status__in=ACTIVE
+            )
+            .exclude(attendee_email__isnull=True)
+            .exclude(attendee_email="")
+            .values_list("attendee_email", "secret")
+        ):
+            key = email.lower()
+            index[key] = None if key in index else secret
+        return index
+
+    def translate(
+        self, rows: Iterable[AssignmentRow], errors: List[str]
+    ) -> Iterator[AssignmentRow]:
+        """
+        Fills in the seat guid and position secret of rows that use one of
+        the alternative column sets. Rows that can not be translated are
+        reported in ``errors`` and left out.
+        """
+        for row in rows:
+            if not row.is_valid:
+                yield row
+                continue
+
+            guid = row.seat_guid
+            if row.seat_label:
+                guid = self.seat_labels.get(row.seat_label, "")
+                if guid is None:
+                    errors.append(
+                        _(
+                            "Seat {label} is ambiguous, please use seat_guid "
+                            "(line {line})."
+                        ).format(label=" / ".join(row.seat_label), line=row.line)
+                    )
+                elif not guid:
+                    errors.append(
+                        _("Unable to match seat ({guid}) in line {line}.").format(
+                            guid=" / ".join(row.seat_label), line=row.line
+                        )
+                    )
+
+            secret = row.orderposition_secret
+            if row.position_label and len(row.position_label) == 2:
+                code, positionid = row.position_label
+                try:
+                    secret = self.position_codes.get((code.upper(), int(positionid)))
+                except ValueError:
+                    secret = None
+                if not secret:
+                    errors.append(
+                        _("Unable to match order ({secret}) in line {line}.").format(
+                            secret="{}-{}".format(code, positionid), line=row.line
+                        )
+                    )
+            elif row.position_label:
+                email = row.position_label[0]
+                secret = self.attendee_emails.get(email.lower(), "")
+                if secret is None:
+                    errors.append(
+                        _(
+                            "The attendee email {email} belongs to more than one "
+                            "ticket (line {line})."
+                        ).format(email=email, line=row.line)
+                    )
+                elif not secret:
+                    errors.append(
+                        _("Unable to match order ({secret}) in line {line}.").format(
+                            secret=email, line=row.line
+                        )
+                    )
+
+            if guid and secret:
+                yield row._replace(seat_guid=guid, orderposition_secret=secret)
+
+    def resolve(self, rows: Iterable[AssignmentRow]) -> List[Assignment]:
+        """
+        Matches every row to a seat and an order position of the event, see
+        :meth:`translate` for rows not identifying them by guid and secret.
+        Raises a ``ValidationError`` listing every problem of the file:
+        rows that could not be matched, seats or positions listed more than
+        once, seats of a category the position's product is not mapped to,
+        and seats currently held by positions that are not part of the file.
+        """
+        errors = []
+        assignments = {}
+        seat_lines: Dict[str, int] = {}
+        position_lines: Dict[str, int] = {}
+        held = []
+        layout = (
+            get_layout(self.event.seating_plan) if self.event.seating_plan else None
+        )
+        done = 0
+        for batch in chunked(self.translate(rows, errors), LOOKUP_BATCH_SIZE):
+            seats = dict(
+                Seat.objects.filter(
+                    event=self.event, seat_guid__in={r.seat_guid for r in batch}
+                ).values_list("seat_guid", "pk")
+            )
+            positions = {
+                secret: (pk, order_id, item_id)
+                for secret, pk, order_id, item_id in OrderPosition.objects.filter(
+                    order__event=self.event,
+                    secret__in={r.orderposition_secret for r in batch},
+                ).values_list("secret", "pk", "order_id", "item_id")
+            }
+            holders = dict(
+                OrderPosition.objects.filter(
+                    order__event=self.event,
+                    order__status__in=ACTIVE,
+                    seat_id__in=seats.values(),
+                ).values_list("seat_id", "secret")
+            )
+
+            for row in batch:
+                if not row.is_valid:
+                    errors.append(
+                        _("Line {line} is not a valid assignment.").format(
+                            line=row.line
+                        )
+                    )
+                    continue
+
+                first = seat_lines.setdefault(row.seat_guid, row.line)
+                if first != row.line:
+                    errors.append(
+                        _(
+                            "Seat {guid} is assigned more than once (lines {first} "
+                            "and {line})."
+                        ).format(guid=row.seat_guid, first=first, line=row.line)
+                    )
+                first = position_lines.setdefault(row.orderposition_secret, row.line)
+                if first != row.line:
+                    errors.append(
+                        _(
+                            "Order ({secret}) is listed more than once (lines "
+                            "{first} and {line})."
+                        ).format(
+                            secret=row.orderposition_secret, first=first, line=row.line
+                        )
+                    )
+
+                position = positions.get(row.orderposition_secret)
+                seat_id = seats.get(row.seat_guid)
+                if not position:
+                    errors.append(
+                        _("Unable to match order ({secret}).").format(
+                            secret=row.orderposition_secret
+                        )
+                    )
+                if not seat_id:
+                    errors.append(
+                        _("Unable to match seat ({guid}).").format(guid=row.seat_guid)
+                    )
+                if not position or not seat_id:
+                    continue
+
+                categories = self.product_categories.get(position[2])
+                seat = layout.by_guid.get(row.seat_guid) if layout else None
+                if categories and seat and seat.category not in categories:
+                    errors.append(
+                        _(
+                            "Seat {guid} in category {category} does not match the "
+                            "product of order ({secret})."
+                        ).format(
+                            guid=row.seat_guid,
+                            category=seat.category,
+                            secret=row.orderposition_secret,
+                        )
+                    )
+
+                holder = holders.get(seat_id)
+                if holder is not None and holder != row.orderposition_secret:
+                    held.append((row.seat_guid, holder))
+                assignments[position[0]] = Assignment(position[0], position[1], seat_id)
+
+            done += len(batch)
+            add_rows(len(batch))
+            if self.progress:
+                self.progress(done, len(errors))
+
+        # Whether the current holder of a seat is part of the file is only
+        # known once all rows have been read.
+        for guid, holder in held:
+            if holder not in position_lines:
+                errors.append(
+                    _(
+                        "Seat {guid} is assigned to order ({secret}), which is not "
+                        "listed in the file. Please remove that assignment first."
+                    ).format(guid=guid, secret=holder)
+                )
+
+        if errors:
+            raise ValidationError(errors)
+        return list(assignments.values())
+
+    def diff(self, assignments: List[Assignment]) -> AssignmentDiff:
+        """
+        Compares the wanted assignments with the current state of the event.
+        Positions of pending and paid orders that currently hold a seat but
+        are not part of ``assignments`` lose their seat.
+        """
+        current = {
+            pk: (seat_id, order_id)
+            for pk, seat_id, order_id in OrderPosition.objects.filter(
+                order__event=self.event, order__status__in=ACTIVE, seat__isnull=False
+            ).values_list("pk", "seat_id", "order_id")
+        }
+
+        changes = []
+        unchanged = 0
+        for a in assignments:
+            previous = current.pop(a.position_id, None)
+            if previous is None:
+                changes.append(SeatChange(a.position_id, a.order_id, None, a.seat_id))
+            elif previous[0] != a.seat_id:
+                changes.append(
+                    SeatChange(a.position_id, a.order_id, previous[0], a.seat_id)
+                )
+            else:
+                unchanged += 1
+
+        for pk, (seat_id, order_id) in current.items():
+            changes.append(SeatChange(pk, order_id, seat_id, None))
+
+        return AssignmentDiff(changes, unchanged)
+
+    def resolve_operations(
+        self, operations: List[AssignmentOperation]
+    ) -> Tuple[AssignmentDiff, List[Tuple[int, str]]]:
+        """
+        Turns a batch of operations into a diff against the current state.
+        Operations are applied in order, so a seat can be freed and assigned
+        again within one batch. Returns the diff and a list of errors as
+        pairs of the operation index and a message. Nothing is locked here,
+        :meth:`apply` checks the diff against the state it finds once the
+        seats are locked.
+        """
+        add_rows(len(operations))
+        seats = dict(
+            Seat.objects.filter(
+                event=self.event, seat_guid__in={o.seat_guid for o in operations}
+            ).values_list("seat_guid", "pk")
+        )
+        positions = {
+            secret: (pk, order_id, seat_id)
+            for secret, pk, order_id, seat_id in OrderPosition.objects.filter(
+                order__event=self.event,
+                secret__in={o.orderposition_secret for o in operations},
+            ).values_list("secret", "pk", "order_id", "seat_id")
+        }
+        holders = dict(
+            OrderPosition.objects.filter(
+                order__event=self.event,
+                order__status__in=ACTIVE,
+                seat_id__in=seats.values(),
+            ).values_list("seat_id", "pk")
+        )
+
+        errors = []
+        state = {pk: seat_id for pk, order_id, seat_id in positions.values()}
+        for o in operations:
+            position = positions.get(o.orderposition_secret)
+            seat_id = seats.get(o.seat_guid)
+            if not position:
+                errors.append(
+                    (
+                        o.index,
+                        _("Unable to match order ({secret}).").format(
+                            secret=o.orderposition_secret
+                        ),
+                    )
+                )
+                continue
+            if not seat_id:
+                errors.append(
+                    (
+                        o.index,
+                        _("Unable to match seat ({guid}).").format(guid=o.seat_guid),
+                    )
+                )
+                continue
+
+            pk = position[0]
+            if o.op == "delete":
+                if state[pk] != seat_id:
+                    errors.append(
+                        (
+                            o.index,
+                            _("Seat {guid} is not assigned to {secret}.").format(
+                                guid=o.seat_guid, secret=o.orderposition_secret
+                            ),
+                        )
+                    )
+                    continue
+                holders.pop(seat_id, None)
+                state[pk] = None
+            else:
+                if holders.get(seat_id, pk) != pk:
+                    errors.append(
+                        (
+                            o.index,
+                            _("Seat {guid} is already assigned.").format(
+                                guid=o.seat_guid
+                            ),
+                        )
+                    )
+                    continue
+                holders.pop(state[pk], None)
+                holders[seat_id] = pk
+                state[pk] = seat_id
+
+        changes = []
+        unchanged = 0
+        for pk, order_id, seat_id in positions.values():
+            if state[pk] == seat_id:
+                unchanged += 1
+            else:
+                changes.append(SeatChange(pk, order_id, seat_id, state[pk]))
+        return AssignmentDiff(changes, unchanged), errors
+
+    def apply(self, diff: AssignmentDiff, atomic: bool = False) -> List[str]:
+        """
+        Writes the changes of a diff while sales may go on. Every change is
+        checked against the current state first: if the position's seat
+        changed or the new seat has been taken by another order, cart or
+        voucher since the diff was computed, the change is skipped. Returns a
+        message for every skipped change.
+
+        By default, changes are written in small chunks, each in its own
+        transaction holding the same seat locks as the checkout, and a chunk
+        whose seats can not be locked in time is skipped as a whole. With
+        ``atomic``, all affected seats are locked at once and the changes are
+        written within the surrounding transaction, as needed by callers that
+        roll back on conflicts.
+
+        Every written change is recorded in the log of its order within the
+        transaction of its chunk, and the import as a whole in the log of the
+        event.
+
+        Seats that move to another position within the import are released
+        first, so swaps do not conflict with themselves.
+        """
+        targets = {c.new_seat_id for c in diff.changes} - {None}
+        changes = sorted(diff.changes, key=lambda c: c.position_id)
+        release = [
+            c
+            for c in changes
+            if c.old_seat_id is not None
+            and (c.new_seat_id is None or c.old_seat_id in targets)
+        ]
+        conflicts: List[SeatConflict] = []
+        if atomic:
+            try:
+                with transaction.atomic():
+                    self._lock_seats({c.old_seat_id for c in release} | targets)
+                    self._apply(changes, release, conflicts, lock_seats=False)
+            except LockTimeoutException:
+                conflicts = [
+                    SeatConflict(c.position_id, None, "locked") for c in changes
+                ]
+        else:
+            self._apply(changes, release, conflicts, lock_seats=True)
+
+        if diff.changes:
+            self.event.log_action(
+                "pretix_manualseats.assignments.imported",
+                user=self.user,
+                auth=self.auth,
+                data={
+                    "added": diff.added,
+                    "moved": diff.moved,
+                    "removed": diff.removed,
+                    "conflicts": len(conflicts),
+                },
+            )
+        invalidate_occupancy(self.event)
+        return self.describe_conflicts(conflicts)
+
+    def _apply(
+        self,
+        changes: List[SeatChange],
+        release: List[SeatChange],
+        conflicts: List[SeatConflict],
+        lock_seats: bool,
+    ):
+        released: Set[int] = set()
+        for batch in chunked(release, LOCK_BATCH_SIZE):
+            try:
+                self._release(batch, released, conflicts, lock_seats)
+            except LockTimeoutException:
+                conflicts.extend(
+                    SeatConflict(c.position_id, None, "locked") for c in batch
+                )
+
+        skipped = {c.position_id for c in conflicts}
+        assign = [
+            c
+            for c in changes
+            if c.new_seat_id is not None and c.position_id not in skipped
+        ]
+        for batch in chunked(assign, LOCK_BATCH_SIZE):
+            try:
+                self._assign(batch, released, conflicts, lock_seats)
+            except LockTimeoutException:
+                # Positions released earlier stay without a seat, their moves
+                # are logged as releases instead.
+                for c in batch:
+                    if c.position_id in released:
+                        self.log.add(c.position_id, c.order_id, c.old_seat_id, None)
+                        conflicts.append(
+                            SeatConflict(
+                                c.position_id, c.new_seat_id, "locked_unseated"
+                            )
+                        )
+                    else:
+                        conflicts.append(SeatConflict(c.position_id, None, "locked"))
+                self.log.write()
+
+    def _lock_seats(self, seat_ids: Set[int]):
+        """
+        Locks the given seats like the checkout does. Locks are taken in
+        primary key order and must only be taken once per transaction.
+        """
+        lock_objects(
+            [Seat(pk=pk) for pk in sorted(seat_ids)],
+            shared_lock_objects=[self.event],
+            replace_exclusive_with_shared_when_exclusive_are_more_than=None,
+        )
+
+    def _lock_positions(self, changes: List[SeatChange]) -> dict:
+        """
+        Locks the positions of ``changes`` in primary key order and returns
+        the current seat of every position.
+        """
+        return dict(
+            OrderPosition.all.filter(pk__in=[c.position_id for c in changes])
+            .select_for_update(of=("self",))
+            .order_by("pk")
+            .values_list("pk", "seat_id")
+        )
+
+    def _taken_seats(self, seat_ids: Set[int]) -> Set[int]:
+        taken = set(
+            OrderPosition.objects.filter(
+                seat_id__in=seat_ids,
+                order__status__in=ACTIVE,
+            ).values_list("seat_id", flat=True)
+        )
+        taken.update(
+            CartPosition.objects.filter(
+                seat_id__in=seat_ids, expires__gte=now()
+            ).values_list("seat_id", flat=True)
+        )
+        taken.update(
+            Voucher.objects.filter(seat_id__in=seat_ids, redeemed__lt=F("max_usages"))
+            .filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now()))
+            .values_list("seat_id", flat=True)
+        )
+        return taken
+
+    def _write(self, positions: List[OrderPosition], order_ids: Set[int]):
+        OrderPosition.all.bulk_update(positions, ["seat"], batch_size=WRITE_BATCH_SIZE)
+        Order.objects.filter(pk__in=order_ids).update(last_modified=now())
+        self.log.write()
+
+    def _release(
+        self,
+        changes: List[SeatChange],
+        released: Set[int],
+        conflicts: List[SeatConflict],
+        lock_seats: bool,
+    ):
+        with transaction.atomic():
+            if lock_seats:
+                self._lock_seats({c.old_seat_id for c in changes})
+            current = self._lock_positions(changes)
+            positions = []
+            order_ids = set()
+            for c in changes:
+                if current.get(c.position_id) != c.old_seat_id:
+                    conflicts.append(SeatConflict(c.position_id, None, "changed"))
+                    continue
+                positions.append(OrderPosition(pk=c.position_id, seat_id=None))
+                order_ids.add(c.order_id)
+                released.add(c.position_id)
+                # Moves are logged once their new seat has been assigned
+                if c.new_seat_id is None:
+                    self.log.add(c.position_id, c.order_id, c.old_seat_id, None)
+            self._write(positions, order_ids)
+
+    def _assign(
+        self,
+        changes: List[SeatChange],
+        released: Set[int],
+        conflicts: List[SeatConflict],
+        lock_seats: bool,
+    ):
+        # Positions that lost their seat in the release phase get it back if
+        # their new seat is not available.
+        fallback = {
+            c.position_id: c.old_seat_id
+            for c in changes
+            if c.position_id in released and c.old_seat_id is not None
+        }
+        seat_ids = {c.new_seat_id for c in changes} | set(fallback.values())
+        with transaction.atomic():
+            if lock_seats:
+                self._lock_seats(seat_ids)
+            current = self._lock_positions(changes)
+            taken = self._taken_seats(seat_ids)
+            positions = []
+            order_ids = set()
+            for c in changes:
+                expected = None if c.position_id in released else c.old_seat_id
+                if current.get(c.position_id) != expected:
+                    conflicts.append(SeatConflict(c.position_id, None, "changed"))
+                    if c.position_id in released:
+                        self.log.add(c.position_id, c.order_id, c.old_seat_id, None)
+                    continue
+
+                seat_id = c.new_seat_id
+                if seat_id in taken:
+                    previous = fallback.get(c.position_id)
+                    if previous is not None and previous not in taken:
+                        conflicts.append(SeatConflict(c.position_id, seat_id, "taken"))
+                        seat_id = previous
+                    else:
+                        conflicts.append(
+                            SeatConflict(
+                                c.position_id,
+                                seat_id,
+                                "unseated" if c.position_id in released else "taken",
+                            )
+                        )
+                        if c.position_id in released:
+                            self.log.add(c.position_id, c.order_id, c.old_seat_id, None)
+                        continue
+
+                taken.add(seat_id)
+                positions.append(OrderPosition(pk=c.position_id, seat_id=seat_id))
+                order_ids.add(c.order_id)
+                self.log.add(c.position_id, c.order_id, c.old_seat_id, seat_id)
+            self._write(positions, order_ids)
+
+    def describe_conflicts(self, conflicts: List[SeatConflict]) -> List[str]:
+        secrets = {}
+        guids = {}
+        for batch in chunked(conflicts, LOOKUP_BATCH_SIZE):
+            secrets.update(
+                OrderPosition.all.filter(
+                    pk__in=[c.position_id for c in batch]
+                ).values_list("pk", "secret")
+            )
+            guids.update(
+                Seat.objects.filter(
+                    pk__in=[c.seat_id for c in batch if c.seat_id]
+                ).values_list("pk", "seat_guid")
+            )
+
+        messages = []
+        for c in conflicts:
+            secret = secrets.get(c.position_id, "")
+            guid = guids.get(c.seat_id, "")
+            if c.reason == "changed":
+                message = _(
+                    "The seat of {secret} has been changed in the meantime and "
+                    "was not updated."
+                )
+            elif c.reason == "taken":
+                message = _(
+                    "Seat {guid} has been taken in the meantime and was not "
+                    "assigned to {secret}."
+                )
+            elif c.reason == "locked":
+                message = _(
+                    "The seats were in use by a checkout and the seat of {secret} "
+                    "was not updated. Please try again."
+                )
+            elif c.reason == "locked_unseated":
+                message = _(
+                    "The seats were in use by a checkout and seat {guid} was not "
+                    "assigned to {secret}, which no longer has a seat."
+                )
+            else:
+                message = _(
+                    "Seat {guid} has been taken in the meantime and was not "
+                    "assigned to {secret}, which no longer has a seat."
+                )
+            messages.append(message.format(secret=secret, guid=guid))
+        return messages
+
+    def run(self, rows: Iterable[AssignmentRow]) -> List[str]:
+        return self.apply(self.diff(self.resolve(rows)))
@@ -0,0 +1,192 @@
+import typing
+from typing import Dict, List, Optional, Tuple
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from pretix.base.models import SeatingPlan
+from types import SimpleNamespace
+
+from .profiling import layout_timer
+
+# Number of parsed layouts kept per process. A parsed stadium plan takes a
+# few MB, so this is deliberately small.
+LRU_SIZE = 8
+CACHE_TIMEOUT = 24 * 3600
+
+RawSeat = SeatingPlan.RawSeat
+Category = SeatingPlan.Category
+
+
+def layout_hash(layout: str) -> str:
+    return hashlib.sha256(layout.encode()).hexdigest()
+
+
+class ParsedLayout:
+    """
+    The parts of a seating plan layout used by this plugin, derived from a
+    single JSON parse. Seats are produced by pretix' own
+    ``SeatingPlan.iter_all_seats`` so ranks and labels match the ``Seat``
+    rows generated from the same plan.
+    """
+
+    def __init__(
+        self,
+        hash: str,
+        name: str,
+        categories: List[str],
+        seats: List,
+        size: Tuple[float, float] = (0, 0),
+        colors: Optional[Dict[str, str]] = None,
+    ):
+        self.hash = hash
+        self.name = name
+        self.size = size
+        self.categories = [Category(name=c) for c in categories]
+        self.colors: Dict[str, str] = colors or {}
+        self.seats = [RawSeat._make(s) for s in seats]
+        self.by_guid: Dict[str, RawSeat] = {s.guid: s for s in self.seats}
+
+        # Rows in layout order, a new row starts whenever zone or row of
+        # consecutive seats differ.
+        self.rows: List[List[RawSeat]] = []
+        previous = None
+        for seat in self.seats:
+            if (seat.zone, seat.row) != previous:
+                self.rows.append([])
+                previous = (seat.zone, seat.row)
+            self.rows[-1].append(seat)
+
+    @property
+    def zones(self) -> List[str]:
+        return list(OrderedDict.fromkeys(s.zone for s in self.seats))
+
+    def category_seats(self, category: str) -> Tuple[Dict[str, List[str]], List[str]]:
+        """
+        The seats of a category as the rows per zone that only hold seats of
+        the category, and the guids of its seats in rows that mix categories.
+        Seats do not know their category, this allows to query them by the
+        indexed columns they have.
+        """
+        by_row: Dict[Tuple[str, str], List[RawSeat]] = OrderedDict()
+        for seat in self.seats:
+            by_row.setdefault((seat.zone, seat.row), []).append(seat)
+
+        rows: Dict[str, List[str]] = {}
+        guids: List[str] = []
+        for (zone, row), seats in by_row.items():
+            matching = [s.guid for s in seats if s.category == category]
+            if len(matching) == len(seats):
+                rows.setdefault(zone, []).append(row)
+            else:
+                guids.extend(matching)
+        return rows, guids
+
+    @classmethod
+    def parse(cls, layout: str, hash: Optional[str] = None) -> "ParsedLayout":
+        data = json.loads(layout)
+        # iter_all_seats only needs ``layout_data`` and ``RawSeat`` from the
+        # plan, which lets us reuse it without parsing the JSON a second time.
+        holder = SimpleNamespace(layout_data=data, RawSeat=RawSeat)
+        return cls(
+            hash or layout_hash(layout),
+            data.get("name", ""),
+            [c["name"] for c in data["categories"]],
+            list(SeatingPlan.iter_all_seats(holder)),  # type: ignore
+            (data["size"]["width"], data["size"]["height"]),
+            {c["name"]: c["color"] for c in data["categories"] if c.get("color")},
+        )
+
+    def __reduce__(self):
+        return (
+            ParsedLayout,
+            (
+                self.hash,
+                self.name,
+                [c.name for c in self.categories],
+                [tuple(s) for s in self.seats],
+                self.size,
+                self.colors,
+            ),
+        )
+
+
+class LayoutCache:
+    """
+    Process-local LRU of parsed layouts keyed by the hash of the layout
+    content, optionally backed by the Django cache so that parsed layouts are
+    shared between workers. Because entries are keyed by content, a changed
+    layout never hits a stale entry; :meth:`invalidate` merely frees the
+    memory of layouts that are no longer used.
+    """
+
+    def __init__(self, size: int = LRU_SIZE):
+        self.size = size
+        self.entries: typing.OrderedDict[str, ParsedLayout] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def use_django_cache(self) -> bool:
+        return settings.CONFIG_FILE.getboolean(
+            "pretix_manualseats", "layout_cache", fallback=False
+        )
+
+    def _cache_key(self, hash: str) -> str:
+        return "pretix_manualseats:layout:{}".format(hash)
+
+    def _remember(self, parsed: ParsedLayout):
+        with self.lock:
+            self.entries[parsed.hash] = parsed
+            self.entries.move_to_end(parsed.hash)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def get(self, layout: str) -> ParsedLayout:
+        hash = layout_hash(layout)
+        with self.lock:
+            parsed = self.entries.get(hash)
+            if parsed:
+                self.entries.move_to_end(hash)
+                return parsed
+
+        if self.use_django_cache:
+            parsed = cache.get(self._cache_key(hash))
+        if not parsed:
+            parsed = ParsedLayout.parse(layout, hash)
+            if self.use_django_cache:
+                cache.set(self._cache_key(hash), parsed, CACHE_TIMEOUT)
+
+        self._remember(parsed)
+        return parsed
+
+    def invalidate(self, layout: str):
+        hash = layout_hash(layout)
+        with self.lock:
+            self.entries.pop(hash, None)
+        if self.use_django_cache:
+            cache.delete(self._cache_key(hash))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+layouts = LayoutCache()
+
+
+def get_layout(plan: SeatingPlan) -> ParsedLayout:
+    """
+    Returns the parsed layout of a seating plan. The result is memoized on
+    the plan instance, so repeated calls within a request do not even hash
+    the layout again.
+    """
+    memo: Optional[Tuple[str, ParsedLayout]] = getattr(plan, "_parsed_layout", None)
+    if memo and memo[0] is plan.layout:
+        return memo[1]
+    with layout_timer():
+        parsed = layouts.get(plan.layout)
+    plan._parsed_layout = (plan.layout, parsed)
+    return parsed
@@ -0,0 +1,165 @@
+from typing import List, NamedTuple, Optional, Tuple
+
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django_scopes import scopes_disabled
+from pretix.base.models import Event, Order, OrderPosition, Seat
+from uuid import uuid4
+
+from .layout import get_layout
+from .profiling import add_rows
+
+CACHE_KEY = "manualseats_occupancy"
+CACHE_TIMEOUT = 60
+VERSION_KEY = "manualseats_assignment_version"
+
+
+class Occupancy(NamedTuple):
+    free: int = 0
+    blocked: int = 0
+    assigned: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.free + self.blocked + self.assigned
+
+    def __add__(self, other: "Occupancy") -> "Occupancy":
+        return Occupancy(*(a + b for a, b in zip(self, other)))
+
+
+class OccupancySummary(NamedTuple):
+    categories: List[Tuple[str, Occupancy]]
+    zones: List[Tuple[str, Occupancy]]
+    products: List[Tuple[str, int]]
+    total: Occupancy
+
+
+def _state(blocked: bool, item_id: Optional[int], count: int) -> Occupancy:
+    if item_id is not None:
+        return Occupancy(assigned=count)
+    if blocked:
+        return Occupancy(blocked=count)
+    return Occupancy(free=count)
+
+
+def compute_occupancy(event: Event) -> Optional[OccupancySummary]:
+    """
+    Counts free, blocked and assigned seats of an event per layout category,
+    zone and product in a single aggregate query.
+
+    Seats do not know their category, it is only part of the layout. Seats
+    are therefore grouped by row and by the product their category is mapped
+    to, which tells the categories of a row apart. Only seats of rows where
+    several categories share a product are counted one by one.
+    """
+    # Imported here, both modules invalidate the occupancy
+    from .importer import LOOKUP_BATCH_SIZE, chunked
+    from .seats import category_mapping
+
+    if not event.seating_plan:
+        return None
+    layout = get_layout(event.seating_plan)
+    mapping = category_mapping(event)
+
+    row_categories = defaultdict(set)
+    group_categories = defaultdict(set)
+    seat_categories = {}
+    for seat in layout.seats:
+        row_categories[seat.zone, seat.row].add(seat.category)
+        group_categories[seat.zone, seat.row, mapping.get(seat.category)].add(
+            seat.category
+        )
+        seat_categories[seat.guid] = seat.category
+
+    def category_of(zone: str, row: str, product_id: Optional[int]) -> Optional[str]:
+        names = group_categories.get((zone, row, product_id)) or row_categories.get(
+            (zone, row), {""}
+        )
+        return next(iter(names)) if len(names) == 1 else None
+
+    # The outer query is already limited to the event. Without scopes, the
+    # subquery is not filtered by organizer either, which would otherwise
+    # make some databases look up positions by organizer instead of by seat.
+    with scopes_disabled():
+        position_item = (
+            OrderPosition.all.filter(seat=OuterRef("pk"), canceled=False)
+            .exclude(order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED))
+            .values("item_id")[:1]
+        )
+    seats = (
+        Seat.objects.filter(event=event, subevent__isnull=True)
+        .annotate(item=Subquery(position_item))
+        .order_by()
+    )
+    rows = seats.values_list(
+        "zone_name", "row_name", "product_id", "blocked", "item"
+    ).annotate(count=Count("pk"))
+
+    categories = defaultdict(Occupancy)
+    zones = defaultdict(Occupancy)
+    products = defaultdict(int)
+    ambiguous = set()
+
+    def add(category: str, zone: str, blocked: bool, item_id: Optional[int], count):
+        occupancy = _state(blocked, item_id, count)
+        categories[category] += occupancy
+        zones[zone] += occupancy
+        if item_id is not None:
+            products[item_id] += count
+
+    for zone, row, product_id, blocked, item_id, count in rows:
+        category = category_of(zone, row, product_id)
+        if category is None:
+            ambiguous.add((zone, row, product_id))
+        else:
+            add(category, zone, blocked, item_id, count)
+
+    ambiguous_rows = {(zone, row) for zone, row, product_id in ambiguous}
+    guids = [s.guid for s in layout.seats if (s.zone, s.row) in ambiguous_rows]
+    for batch in chunked(guids, LOOKUP_BATCH_SIZE):
+        for guid, zone, row, product_id, blocked, item_id in seats.filter(
+            seat_guid__in=batch
+        ).values_list(
+            "seat_guid", "zone_name", "row_name", "product_id", "blocked", "item"
+        ):
+            if (zone, row, product_id) in ambiguous:
+                add(seat_categories.get(guid, ""), zone, blocked, item_id, 1)
+    add_rows(sum(c.total for c in categories.values()))
+
+    names = {i.pk: str(i.name) for i in event.items.filter(pk__in=products)}
+    order = {c.name: i for i, c in enumerate(layout.categories)}
+    return OccupancySummary(
+        categories=sorted(
+            categories.items(), key=lambda c: order.get(c[0], len(order))
+        ),
+        zones=sorted(zones.items()),
+        products=sorted(
+            ((names.get(pk, ""), count) for pk, count in products.items()),
+            key=lambda p: p[0],
+        ),
+        total=sum(categories.values(), Occupancy()),
+    )
+
+
+def get_occupancy(event: Event) -> Optional[OccupancySummary]:
+    return event.cache.get_or_set(
+        CACHE_KEY, lambda: compute_occupancy(event), timeout=CACHE_TIMEOUT
+    )
+
+
+def get_assignment_version(event: Event) -> str:
+    """
+    Returns a token identifying the current seats and assignments of an
+    event, which changes with every call to :func:`invalidate_occupancy`.
+    Results derived from the assignments can be cached under this token
+    without expiring them.
+    """
+    return event.cache.get_or_set(VERSION_KEY, lambda: uuid4().hex, timeout=None)
+
+
+def invalidate_occupancy(event: Event):
+    event.cache.delete(CACHE_KEY)
+    # A version read before the commit would otherwise be used to cache the
+    # old assignments again.
+    transaction.on_commit(lambda: event.cache.delete(VERSION_KEY))
@@ -0,0 +1,178 @@
+"""
+Opt-in instrumentation of the plugin's control views and navigation receivers.
+
+Profiling is enabled in the pretix configuration file::
+
+    [pretix_manualseats]
+    profiling=on
+
+Every instrumented request then records its SQL queries, the time spent on
+them and on parsing seating plan layouts, and the number of rows processed.
+The results are logged to the ``pretix_manualseats.profiling`` logger and the
+most recent ones are shown to administrators on a debug page. When profiling
+is disabled, views and receivers are returned unchanged.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils.timezone import now
+from functools import wraps
+
+ENABLED = settings.CONFIG_FILE.getboolean(
+    "pretix_manualseats", "profiling", fallback=False
+)
+RECENT_CACHE_KEY = "pretix_manualseats:profiles"
+RECENT_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["Profile"]] = ContextVar(
+    "manualseats_profile", default=None
+)
+
+
+class Profile:
+    """
+    Collects the measurements of one view or receiver call. It is installed
+    as a database execute wrapper for the duration of the call.
+    """
+
+    def __init__(self, name: str, path: str = ""):
+        self.name = name
+        self.path = path
+        self.started = now()
+        self.queries = 0
+        self.query_time = 0.0
+        self.layout_time = 0.0
+        self.rows = 0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.queries += 1
+
+    @contextmanager
+    def layout_timer(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.layout_time += time.perf_counter() - start
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "started": self.started.isoformat(),
+            "queries": self.queries,
+            "query_ms": round(self.query_time * 1000, 1),
+            "layout_ms": round(self.layout_time * 1000, 1),
+            "rows": self.rows,
+            "total_ms": round(self.total_time * 1000, 1),
+        }
+
+
+def _emit(profile: Profile):
+    data = profile.as_dict()
+    logger.info(
+        "manualseats profile name=%s path=%s queries=%d query_ms=%.1f "
+        "layout_ms=%.1f rows=%d total_ms=%.1f",
+        data["name"],
+        data["path"],
+        data["queries"],
+        data["query_ms"],
+        data["layout_ms"],
+        data["rows"],
+        data["total_ms"],
+        extra={"manualseats_profile": data},
+    )
+    recent = cache.get(RECENT_CACHE_KEY) or []
+    recent.append(data)
+    cache.set(RECENT_CACHE_KEY, recent[-RECENT_SIZE:], None)
+
+
+@contextmanager
+def profile(name: str, path: str = ""):
+    """
+    Profiles the enclosed block. Profiles nest, the queries of an inner block
+    are counted in the outer one as well.
+    """
+    p = Profile(name, path)
+    token = _current.set(p)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(p):
+            yield p
+    finally:
+        p.total_time = time.perf_counter() - start
+        _current.reset(token)
+        _emit(p)
+
+
+def layout_timer():
+    """
+    Measures the enclosed block as layout parsing time of the current profile.
+    """
+    p = _current.get()
+    return p.layout_timer() if p else nullcontext()
+
+
+def add_rows(count: int):
+    """
+    Adds to the number of rows processed within the current profile.
+    """
+    p = _current.get()
+    if p:
+        p.rows += count
+
+
+def get_recent_profiles() -> List[Dict[str, Any]]:
+    return list(reversed(cache.get(RECENT_CACHE_KEY) or []))
+
+
+def instrument_view(cls):
+    """
+    Class decorator profiling the ``dispatch`` of a view, including the
+    rendering of its template response.
+    """
+    if not ENABLED:
+        return cls
+    dispatch = cls.dispatch
+
+    @wraps(dispatch)
+    def profiled_dispatch(self, request, *args, **kwargs):
+        with profile(cls.__name__, request.path):
+            response = dispatch(self, request, *args, **kwargs)
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+
+    cls.dispatch = profiled_dispatch
+    return cls
+
+
+def instrument_receiver(func):
+    """
+    Decorator profiling a signal receiver. Must be applied below
+    ``@receiver``.
+    """
+    if not ENABLED:
+        return func
+
+    @wraps(func)
+    def profiled_receiver(sender, request=None, **kwargs):
+        with profile(func.__name__, request.path if request else ""):
+            return func(sender, request=request, **kwargs)
+
+    return profiled_receiver
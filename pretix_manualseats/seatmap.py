@@ -0,0 +1,152 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import gzip
+import re
+from django.utils.html import escape
+from django.utils.translation import get_language, gettext
+from pretix.base.models import Event, OrderPosition, Seat
+
+from .importer import ACTIVE
+from .layout import ParsedLayout, RawSeat
+from .occupancy import get_assignment_version
+from .profiling import add_rows
+
+CACHE_KEY = "manualseats_seatmap"
+# Maps are cached under the assignment version, which changes with every
+# assignment. The timeout only frees memory of maps that are not viewed.
+CACHE_TIMEOUT = 24 * 3600
+SEAT_RADIUS = 10
+# Number of assigned positions listed by a lookup on the seat map page
+LOOKUP_LIMIT = 50
+DEFAULT_COLOR = "#888888"
+FREE_COLOR = "#ffffff"
+BLOCKED_COLOR = "#cccccc"
+# Colors come from uploaded layouts and end up in a stylesheet
+COLOR_RE = re.compile(r"^#[0-9a-fA-F]{3,8}$")
+
+
+def seat_names(seats: Iterable[RawSeat]) -> Iterator[str]:
+    """
+    Names of layout seats as given by ``Seat.__str__``, with the labels
+    translated once instead of for every seat.
+    """
+    row_format = gettext("Row {number}")
+    seat_format = gettext("Seat {number}")
+    for seat in seats:
+        parts = []
+        if seat.zone:
+            parts.append(seat.zone)
+        if seat.row_label:
+            parts.append(seat.row_label)
+        elif seat.row:
+            parts.append(row_format.format(number=seat.row))
+        if seat.seat_label:
+            parts.append(seat.seat_label)
+        elif seat.number:
+            parts.append(seat_format.format(number=seat.number))
+        yield ", ".join(parts) if parts else seat.guid
+
+
+def category_colors(layout: ParsedLayout) -> List[Tuple[str, str]]:
+    return [
+        (
+            c.name,
+            (
+                layout.colors[c.name]
+                if COLOR_RE.match(layout.colors.get(c.name, ""))
+                else DEFAULT_COLOR
+            ),
+        )
+        for c in layout.categories
+    ]
+
+
+def render_seat_map(event: Event, layout: ParsedLayout) -> str:
+    """
+    Renders the seats of an event as SVG. Seats are filled with the color of
+    their category if they are assigned, white if they are free and grey if
+    they are blocked. Every seat has a title with its name and the order
+    position it is assigned to, which browsers show on hover.
+    """
+    blocked = set(
+        Seat.objects.filter(event=event, subevent__isnull=True, blocked=True)
+        .order_by()
+        .values_list("seat_guid", flat=True)
+    )
+    assigned: Dict[str, str] = {
+        guid: "{}-{}{}".format(code, positionid, " ({})".format(name) if name else "")
+        for guid, code, positionid, name in OrderPosition.objects.filter(
+            order__event=event, order__status__in=ACTIVE, seat__isnull=False
+        )
+        .order_by()
+        .values_list(
+            "seat__seat_guid", "order__code", "positionid", "attendee_name_cached"
+        )
+    }
+    add_rows(len(layout.seats))
+
+    classes = {}
+    style = []
+    for i, (name, color) in enumerate(category_colors(layout)):
+        classes[name] = "c{}".format(i)
+        style.append(".c{}{{fill:{};stroke:{}}}".format(i, color, color))
+    # Later rules win, so free and blocked seats keep the category's stroke
+    style.append(".f{{fill:{}}}".format(FREE_COLOR))
+    style.append(".b{{fill:{}}}".format(BLOCKED_COLOR))
+
+    width, height = layout.size
+    out = [
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {:g} {:g}">'.format(
+            width, height
+        ),
+        "<style>circle{{stroke-width:2}}{}</style>".format("".join(style)),
+    ]
+    for seat, title in zip(layout.seats, seat_names(layout.seats)):
+        if seat.guid in assigned:
+            state = ""
+            title = "{}: {}".format(title, assigned[seat.guid])
+        elif seat.guid in blocked:
+            state = " b"
+        else:
+            state = " f"
+        out.append(
+            '<circle cx="{:g}" cy="{:g}" r="{}" class="{}{}" data-guid="{}">'
+            "<title>{}</title></circle>".format(
+                seat.x,
+                seat.y,
+                SEAT_RADIUS,
+                classes.get(seat.category, ""),
+                state,
+                escape(seat.guid),
+                escape(title),
+            )
+        )
+    out.append("</svg>")
+    return "".join(out)
+
+
+def seat_map_key(event: Event, layout: ParsedLayout) -> str:
+    """
+    Identifies the seat map of an event as long as neither its layout nor its
+    assignments change. Seat names are translated, so the language is part of
+    the key.
+    """
+    return "{}:{}:{}:{}".format(
+        CACHE_KEY, layout.hash, get_assignment_version(event), get_language()
+    )
+
+
+def get_seat_map(
+    event: Event, layout: ParsedLayout, key: Optional[str] = None
+) -> bytes:
+    """
+    Returns the gzip compressed seat map of an event, rendering it only if it
+    is not cached yet. Maps of large plans have a few MB, compressed they
+    still fit into a single cache entry.
+    """
+    key = key or seat_map_key(event, layout)
+    content = event.cache.get(key)
+    if content is None:
+        content = gzip.compress(render_seat_map(event, layout).encode())
+        event.cache.set(key, content, CACHE_TIMEOUT)
+    return content
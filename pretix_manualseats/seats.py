@@ -0,0 +1,296 @@
+from typing import Dict, List, NamedTuple, Optional
+
+import json
+from django.db import transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+from pretix.base.models import (
+    CartPosition,
+    Event,
+    Order,
+    OrderPosition,
+    Seat,
+    SeatCategoryMapping,
+    SeatingPlan,
+    SubEvent,
+    Voucher,
+)
+from pretix.base.services.seating import SeatProtected
+
+from .importer import LOOKUP_BATCH_SIZE, WRITE_BATCH_SIZE, chunked
+from .layout import ParsedLayout, get_layout, layout_hash
+from .occupancy import invalidate_occupancy
+from .profiling import add_rows
+
+# Plans with more seats than this are applied in a background task.
+ASYNC_SEAT_THRESHOLD = 10000
+# Event setting holding the hash of the layout the seats were generated from.
+LAYOUT_HASH_SETTING = "manualseats_layout_hash"
+
+SEAT_FIELDS = (
+    "row_name",
+    "seat_number",
+    "zone_name",
+    "sorting_rank",
+    "row_label",
+    "seat_label",
+    "x",
+    "y",
+    "product_id",
+)
+
+
+class SeatDiff(NamedTuple):
+    create: List[Seat]
+    update: List[Seat]
+    delete: List[int]
+    # Ids of seats whose product is the only change, by their new product
+    reassign: Optional[Dict[Optional[int], List[int]]] = None
+
+    def __bool__(self):
+        return bool(self.create or self.update or self.delete or self.reassign)
+
+    @property
+    def updated(self) -> int:
+        return len(self.update) + sum(len(v) for v in (self.reassign or {}).values())
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "created": len(self.create),
+            "updated": self.updated,
+            "deleted": len(self.delete),
+        }
+
+
+class SeatSynchronizer:
+    """
+    Brings the ``Seat`` rows of an event in line with the layout of a seating
+    plan. This does the same as pretix' ``generate_seats``, but compares the
+    plan with the current seats by their guid and only inserts, updates or
+    deletes the seats that differ, in bulk.
+
+    Seats get the product their category is mapped to, either by ``mapping``
+    of layout categories to product ids or by the category mapping of the
+    event or subevent.
+
+    For events without subevents the hash of the layout and the mapping is
+    remembered in the event settings, so applying an unchanged plan again
+    only costs a count of the seats.
+    """
+
+    def __init__(
+        self,
+        event: Event,
+        plan: Optional[SeatingPlan],
+        subevent: Optional[SubEvent] = None,
+        mapping: Optional[Dict[str, int]] = None,
+    ):
+        self.event = event
+        self.plan = plan
+        self.subevent = subevent
+        if mapping is not None:
+            self.mapping = mapping
+
+    @property
+    def layout(self) -> Optional[ParsedLayout]:
+        return get_layout(self.plan) if self.plan else None
+
+    @cached_property
+    def mapping(self) -> Dict[str, int]:
+        return category_mapping(self.event, self.subevent)
+
+    @property
+    def hash(self) -> str:
+        return layout_hash(json.dumps([self.layout.hash, sorted(self.mapping.items())]))
+
+    def seats(self):
+        return Seat.objects.filter(event=self.event, subevent=self.subevent)
+
+    def is_current(self) -> bool:
+        if self.subevent:
+            return False
+        if not self.plan:
+            return not self.seats().exists()
+        if self.event.settings.get(LAYOUT_HASH_SETTING) != self.hash:
+            return False
+        return self.seats().count() == len(self.layout.seats)
+
+    def diff(self) -> SeatDiff:
+        current = {}
+        delete = []
+        for values in self.seats().values_list("pk", "seat_guid", *SEAT_FIELDS):
+            if values[1] in current:
+                # Duplicates should not exist
+                delete.append(values[0])
+            else:
+                current[values[1]] = values
+
+        create = []
+        update = []
+        reassign: Dict[Optional[int], List[int]] = {}
+        for raw in self.layout.seats if self.plan else []:
+            wanted = (
+                raw.row,
+                raw.number,
+                raw.zone,
+                raw.sorting_rank,
+                raw.row_label,
+                raw.seat_label,
+                raw.x,
+                raw.y,
+                self.mapping.get(raw.category),
+            )
+            seat = Seat(
+                event=self.event,
+                subevent=self.subevent,
+                seat_guid=raw.guid,
+                **dict(zip(SEAT_FIELDS, wanted)),
+            )
+            values = current.pop(raw.guid, None)
+            if values is None:
+                create.append(seat)
+            elif tuple(values[2:-1]) == wanted[:-1]:
+                # product_id comes last, it alone changes with the mapping
+                if values[-1] != wanted[-1]:
+                    reassign.setdefault(wanted[-1], []).append(values[0])
+            else:
+                seat.pk = values[0]
+                update.append(seat)
+
+        delete += [values[0] for values in current.values()]
+        diff = SeatDiff(create, update, delete, reassign)
+        add_rows(len(create) + diff.updated + len(delete))
+        return diff
+
+    def check_protected(self, seat_ids: List[int]):
+        for batch in chunked(seat_ids, LOOKUP_BATCH_SIZE):
+            seat = (
+                Seat.objects.filter(
+                    pk__in=OrderPosition.all.filter(seat__in=batch, canceled=False)
+                    .exclude(
+                        order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED)
+                    )
+                    .values("seat_id")
+                )
+                .order_by("sorting_rank")
+                .first()
+            )
+            if seat:
+                raise SeatProtected(
+                    'You can not change the plan since seat "%s" is not present in '
+                    "the new plan and is already sold.",
+                    seat.name,
+                )
+            seat = (
+                Seat.objects.filter(
+                    pk__in=Voucher.objects.filter(seat__in=batch).values("seat_id")
+                )
+                .order_by("sorting_rank")
+                .first()
+            )
+            if seat:
+                raise SeatProtected(
+                    'You can not change the plan since seat "%s" is not present in '
+                    "the new plan and is already used in a voucher.",
+                    seat.name,
+                )
+
+    @transaction.atomic
+    def apply(self, diff: SeatDiff):
+        self.check_protected(diff.delete)
+        for batch in chunked(diff.delete, LOOKUP_BATCH_SIZE):
+            CartPosition.objects.filter(addon_to__seat__in=batch).delete()
+            CartPosition.objects.filter(seat__in=batch).delete()
+            OrderPosition.all.filter(
+                Q(canceled=True)
+                | Q(order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED)),
+                seat__in=batch,
+            ).update(seat=None)
+            Seat.objects.filter(pk__in=batch).delete()
+
+        Seat.objects.bulk_update(diff.update, SEAT_FIELDS, batch_size=WRITE_BATCH_SIZE)
+        for product_id, seat_ids in (diff.reassign or {}).items():
+            for batch in chunked(seat_ids, LOOKUP_BATCH_SIZE):
+                Seat.objects.filter(pk__in=batch).update(product_id=product_id)
+        Seat.objects.bulk_create(diff.create, batch_size=WRITE_BATCH_SIZE)
+
+        if self.subevent:
+            return
+        if self.plan:
+            self.event.settings.set(LAYOUT_HASH_SETTING, self.hash)
+        else:
+            self.event.settings.delete(LAYOUT_HASH_SETTING)
+        invalidate_occupancy(self.event)
+
+    def run(self) -> SeatDiff:
+        if self.is_current():
+            return SeatDiff([], [], [])
+        diff = self.diff()
+        self.apply(diff)
+        return diff
+
+
+def category_mapping(
+    event: Event, subevent: Optional[SubEvent] = None
+) -> Dict[str, int]:
+    """
+    The product id every layout category of the event or subevent is mapped
+    to. If a category is mapped more than once, the first mapping wins.
+    """
+    mapping: Dict[str, int] = {}
+    for category, product_id in (
+        SeatCategoryMapping.objects.filter(event=event, subevent=subevent)
+        .order_by("pk")
+        .values_list("layout_category", "product_id")
+    ):
+        mapping.setdefault(category, product_id)
+    return mapping
+
+
+def seats_in_use(event: Event) -> bool:
+    """
+    Whether tickets of the event have seats, which keeps its seating plan
+    from being changed.
+    """
+    return OrderPosition.objects.filter(order__event=event, seat__isnull=False).exists()
+
+
+@transaction.atomic
+def apply_seating_plan(event: Event, plan: Optional[SeatingPlan]) -> SeatDiff:
+    """
+    Sets the seating plan of an event and synchronizes its seats. Removing
+    the plan also removes the category mappings of the event, but not those
+    of its subevents.
+    """
+    event.seating_plan = plan
+    event.save(update_fields=["seating_plan"])
+    if not plan:
+        SeatCategoryMapping.objects.filter(event=event, subevent__isnull=True).delete()
+    return SeatSynchronizer(event, plan).run()
+
+
+@transaction.atomic
+def apply_subevent_seating_plan(
+    subevent: SubEvent, plan: SeatingPlan, mapping: Optional[Dict[str, int]] = None
+) -> SeatDiff:
+    """
+    Sets the seating plan of a subevent and synchronizes its seats. If a
+    mapping of layout categories to product ids is given, it replaces the
+    category mapping of the subevent.
+    """
+    subevent.seating_plan = plan
+    subevent.save(update_fields=["seating_plan"])
+    if mapping is not None:
+        SeatCategoryMapping.objects.filter(
+            event=subevent.event, subevent=subevent
+        ).delete()
+        SeatCategoryMapping.objects.bulk_create(
+            SeatCategoryMapping(
+                event=subevent.event,
+                subevent=subevent,
+                layout_category=category,
+                product_id=product_id,
+            )
+            for category, product_id in mapping.items()
+        )
+    return SeatSynchronizer(subevent.event, plan, subevent, mapping).run()
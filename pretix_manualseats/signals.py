@@ -1,15 +1,52 @@
 from django.contrib.staticfiles import finders
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.urls import resolve, reverse
 from django.utils.translation import gettext_lazy as _
-from pretix.control.signals import nav_event, nav_organizer
+from functools import lru_cache
+from pretix.base.models import Event, Organizer, Seat
+from pretix.base.signals import (
+    order_canceled,
+    order_changed,
+    order_expired,
+    order_gracefully_delete,
+    order_modified,
+    order_placed,
+    order_reactivated,
+    order_split,
+    register_data_exporters,
+)
+from pretix.control.signals import nav_event, nav_global, nav_organizer
 
-seat_icon = open(finders.find("pretix_manualseats/icons/seat.svg", all=False)).read()
+from . import profiling
+from .occupancy import invalidate_occupancy
+from .profiling import instrument_receiver
+
+# Organizer cache key telling whether any event of the organizer uses the plugin
+PLUGIN_ACTIVE_CACHE_KEY = "manualseats_plugin_active"
+
+
+@lru_cache(maxsize=None)
+def get_seat_icon() -> str:
+    with open(finders.find("pretix_manualseats/icons/seat.svg", all=False)) as f:
+        return f.read()
+
+
+def plugin_active(organizer) -> bool:
+    return organizer.cache.get_or_set(
+        PLUGIN_ACTIVE_CACHE_KEY,
+        lambda: organizer.events.filter(
+            plugins__icontains="pretix_manualseats"
+        ).exists(),
+        timeout=3600,
+    )
 
 
 @receiver(nav_event, dispatch_uid="manualsets_nav")
+@instrument_receiver
 def control_nav_manualseats(sender, request=None, **kwargs):
     url = resolve(request.path_info)
+    seat_icon = get_seat_icon()
     if not request.user.has_event_permission(
         request.organizer, request.event, "can_change_event_settings", request=request
     ):
@@ -51,19 +88,86 @@ def control_nav_manualseats(sender, request=None, **kwargs):
                     "active": (url.namespace == "plugins:pretix_manualseats"),
                     "icon": seat_icon,
                 },
-            ],
+                {
+                    "label": _("Seats"),
+                    "url": reverse(
+                        "plugins:pretix_manualseats:assignments",
+                        kwargs={
+                            "event": request.event.slug,
+                            "organizer": request.organizer.slug,
+                        },
+                    ),
+                    "active": (url.namespace == "plugins:pretix_manualseats"),
+                    "icon": seat_icon,
+                },
+                {
+                    "label": _("Seat Allocation"),
+                    "url": reverse(
+                        "plugins:pretix_manualseats:allocate",
+                        kwargs={
+                            "event": request.event.slug,
+                            "organizer": request.organizer.slug,
+                        },
+                    ),
+                    "active": (url.namespace == "plugins:pretix_manualseats"),
+                    "icon": seat_icon,
+                },
+                {
+                    "label": _("Seat Map"),
+                    "url": reverse(
+                        "plugins:pretix_manualseats:seatmap",
+                        kwargs={
+                            "event": request.event.slug,
+                            "organizer": request.organizer.slug,
+                        },
+                    ),
+                    "active": (url.namespace == "plugins:pretix_manualseats"),
+                    "icon": seat_icon,
+                },
+                {
+                    "label": _("Copy from Event"),
+                    "url": reverse(
+                        "plugins:pretix_manualseats:copy",
+                        kwargs={
+                            "event": request.event.slug,
+                            "organizer": request.organizer.slug,
+                        },
+                    ),
+                    "active": (url.namespace == "plugins:pretix_manualseats"),
+                    "icon": seat_icon,
+                },
+            ]
+            + (
+                [
+                    {
+                        "label": _("Dates"),
+                        "url": reverse(
+                            "plugins:pretix_manualseats:subevents",
+                            kwargs={
+                                "event": request.event.slug,
+                                "organizer": request.organizer.slug,
+                            },
+                        ),
+                        "active": (url.namespace == "plugins:pretix_manualseats"),
+                        "icon": seat_icon,
+                    },
+                ]
+                if request.event.has_subevents
+                else []
+            ),
         },
     ]
 
 
 @receiver(nav_organizer, dispatch_uid="manualseats_orga_nav")
+@instrument_receiver
 def control_nav_orga_manualseats(sender, request=None, **kwargs):
     url = resolve(request.path_info)
     if not request.user.has_organizer_permission(
         request.organizer, "can_change_organizer_settings", request=request
     ):
         return []
-    if not request.organizer.events.filter(plugins__icontains="pretix_manualseats"):
+    if not plugin_active(request.organizer):
         return []
     return [
         {
@@ -75,6 +179,57 @@ def control_nav_orga_manualseats(sender, request=None, **kwargs):
                 },
             ),
             "active": (url.namespace == "plugins:pretix_manualseats"),
-            "icon": seat_icon,
+            "icon": get_seat_icon(),
+        },
+    ]
+
+
+@receiver(nav_global, dispatch_uid="manualseats_global_nav")
+def control_nav_global_manualseats(sender, request=None, **kwargs):
+    if not profiling.ENABLED or not request.user.has_active_staff_session(
+        request.session.session_key
+    ):
+        return []
+    return [
+        {
+            "label": _("Manual Seats profiling"),
+            "url": reverse("plugins:pretix_manualseats:profiling"),
+            "active": resolve(request.path_info).url_name == "profiling",
+            "icon": "tachometer",
         },
     ]
+
+
+@receiver(register_data_exporters, dispatch_uid="manualseats_export_assignments")
+def register_assignment_exporter(sender, **kwargs):
+    from .exporters import SeatAssignmentExporter
+
+    return SeatAssignmentExporter
+
+
+@receiver(post_save, sender=Event, dispatch_uid="manualseats_event_saved")
+@receiver(post_delete, sender=Event, dispatch_uid="manualseats_event_deleted")
+def invalidate_plugin_active(sender, instance, **kwargs):
+    # The plugin list of an event can change with every save. The organizer is
+    # not loaded since it might be deleted along with the event.
+    Organizer(pk=instance.organizer_id).cache.delete(PLUGIN_ACTIVE_CACHE_KEY)
+
+
+@receiver(order_placed, dispatch_uid="manualseats_order_placed")
+@receiver(order_canceled, dispatch_uid="manualseats_order_canceled")
+@receiver(order_reactivated, dispatch_uid="manualseats_order_reactivated")
+@receiver(order_expired, dispatch_uid="manualseats_order_expired")
+@receiver(order_modified, dispatch_uid="manualseats_order_modified")
+@receiver(order_changed, dispatch_uid="manualseats_order_changed")
+@receiver(order_split, dispatch_uid="manualseats_order_split")
+@receiver(order_gracefully_delete, dispatch_uid="manualseats_order_deleted")
+def invalidate_assignments(sender, **kwargs):
+    # Seats are also taken and released by pretix itself, e.g. in the checkout
+    # or when an order is canceled or changed.
+    invalidate_occupancy(sender)
+
+
+@receiver(post_save, sender=Seat, dispatch_uid="manualseats_seat_saved")
+def invalidate_seat(sender, instance, **kwargs):
+    # Seats are blocked and unblocked one by one through the API
+    invalidate_occupancy(Event(pk=instance.event_id))
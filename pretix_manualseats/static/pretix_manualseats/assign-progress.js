@@ -0,0 +1,3 @@
+$(() => {
+    window.setTimeout(() => window.location.reload(), 2000);
+});
@@ -0,0 +1,43 @@
+$(() => {
+    // Single assignments are saved without reloading the page. Without
+    // JavaScript, the forms are posted and redirect back to the list.
+    $("form.manualseats-assignment").on("submit", (e) => {
+        e.preventDefault();
+        const form = $(e.target);
+        const row = form.closest("tr");
+        const error = form.find(".manualseats-error");
+        const button = form.find("button");
+
+        button.prop("disabled", true);
+        error.text("");
+        form.removeClass("has-error has-success");
+        $.ajax({
+            url: form.attr("action"),
+            method: "POST",
+            data: form.serialize(),
+            dataType: "json",
+        }).done((data) => {
+            const position = data.position;
+            row.find(".manualseats-status").html(
+                $("#manualseats-labels [data-status=" + data.status + "]").clone()
+            );
+            row.find(".manualseats-attendee").text(position ? position.attendee : "");
+            form.find("input[name=ticket]").val(
+                position ? position.order + "-" + position.positionid : ""
+            );
+            form.find(".manualseats-order").remove();
+            if (position) {
+                $("<a>", {href: position.url, "class": "manualseats-order"})
+                    .append($("<i>", {"class": "fa fa-external-link"}))
+                    .insertBefore(error);
+            }
+            form.addClass("has-success");
+        }).fail((xhr) => {
+            const data = xhr.responseJSON || {};
+            error.text(data.error || xhr.statusText);
+            form.addClass("has-error");
+        }).always(() => {
+            button.prop("disabled", false);
+        });
+    });
+});
@@ -0,0 +1,315 @@
+from typing import List, Optional
+
+import csv
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils.timezone import now
+from django.utils.translation import gettext as _
+from django_scopes import scope
+from pretix.base.i18n import language
+from pretix.base.models import CachedFile, Event, Organizer, SeatingPlan, User
+from pretix.base.services.seating import SeatProtected
+from pretix.base.services.tasks import EventTask, OrganizerUserTask
+from pretix.celery_app import app
+
+from .copy import copy_mapping
+from .importer import (
+    CONFLICT_REPORT,
+    ERROR_REPORT,
+    SAMPLE_SIZE,
+    SeatAssignmentImporter,
+    count_rows,
+    open_upload,
+    read_rows,
+)
+from .layout import get_layout
+from .seats import (
+    apply_seating_plan,
+    apply_subevent_seating_plan,
+    category_mapping,
+    seats_in_use,
+)
+
+logger = logging.getLogger(__name__)
+
+EVENTS_REPORT = "seatingplan-events.csv"
+# Number of events whose seats are generated at the same time when a plan is
+# applied to many events. SQLite allows only one writer at a time, so events
+# are handled one after another there.
+EVENT_WORKERS = 4
+
+
+def _write_csv(cf: CachedFile, header: List[str], rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    writer.writerows(rows)
+    cf.file.save(cf.filename, ContentFile(output.getvalue().encode()))
+
+
+def _csv_file(
+    filename: str, header: List[str], rows, session_key: Optional[str]
+) -> CachedFile:
+    cf = CachedFile.objects.create(
+        expires=now() + timedelta(days=1),
+        date=now(),
+        filename=filename,
+        type="text/csv",
+        session_key=session_key,
+    )
+    _write_csv(cf, header, rows)
+    return cf
+
+
+def _error_report(
+    errors, session_key: Optional[str], filename: str = ERROR_REPORT
+) -> CachedFile:
+    return _csv_file(filename, ["error"], ([m] for m in errors), session_key)
+
+
+@app.task(base=EventTask, bind=True, throws=(ValidationError,))
+def import_assignments(
+    self,
+    event: Event,
+    fileid: str,
+    locale: str,
+    session_key: Optional[str] = None,
+    user: Optional[int] = None,
+) -> dict:
+    """
+    Runs a seat assignment import from an uploaded file in the background.
+    Progress is reported as task state, including the number of processed
+    rows, the number of errors found so far and an estimate of the remaining
+    time. If any row can not be imported, nothing is written and an error
+    report is returned instead. Changes that conflict with concurrent sales
+    are skipped and listed in a report as well.
+    """
+    user = User.objects.get(pk=user) if user else None
+    cf = CachedFile.objects.get(id=fileid)
+    cf.file.open("rb")
+    total = count_rows(cf.file)
+    started = time.monotonic()
+
+    def progress(done, errors):
+        if self.request.called_directly:
+            return
+        elapsed = time.monotonic() - started
+        self.update_state(
+            state="PROGRESS",
+            meta={
+                "value": round(min(done / total, 1) * 90) if total else 0,
+                "rows": done,
+                "total": total,
+                "errors": errors,
+                "eta": round(elapsed / done * max(total - done, 0)) if done else None,
+            },
+        )
+
+    with language(locale, event.settings.region):
+        importer = SeatAssignmentImporter(event, progress=progress, user=user)
+        try:
+            diff = importer.diff(importer.resolve(read_rows(open_upload(cf.file))))
+        except ValidationError as e:
+            report = _error_report(e.messages, session_key)
+            return {"errors": len(e.messages), "report": str(report.id)}
+
+        conflicts = importer.apply(diff)
+        cf.delete()
+        result = {
+            "errors": 0,
+            "added": diff.added,
+            "moved": diff.moved,
+            "removed": diff.removed,
+            "conflicts": len(conflicts),
+        }
+        if conflicts:
+            report = _error_report(conflicts, session_key, CONFLICT_REPORT)
+            result["report"] = str(report.id)
+            result["conflict_sample"] = conflicts[:SAMPLE_SIZE]
+        return result
+
+
+@app.task(base=EventTask, bind=True, throws=(SeatProtected,))
+def set_seating_plan(self, event: Event, plan: Optional[int], locale: str) -> dict:
+    """
+    Applies a seating plan to an event in the background, used for plans with
+    too many seats to be generated within a request.
+    """
+    with language(locale, event.settings.region):
+        plan = (
+            SeatingPlan.objects.get(organizer=event.organizer, pk=plan)
+            if plan
+            else None
+        )
+        return apply_seating_plan(event, plan).as_dict()
+
+
+@app.task(base=EventTask, bind=True)
+def setup_subevents(
+    self,
+    event: Event,
+    plan: int,
+    subevents: Optional[List[int]],
+    copy_mapping: bool,
+    locale: str,
+) -> dict:
+    """
+    Applies a seating plan to many subevents of an event series. Every
+    subevent is handled in its own transaction, so a subevent whose seats can
+    not be changed is reported and skipped without affecting the others.
+    Progress is reported as the number of processed subevents.
+    """
+    plan = SeatingPlan.objects.get(organizer=event.organizer, pk=plan)
+    qs = event.subevents.order_by("date_from", "pk")
+    if subevents is not None:
+        qs = qs.filter(pk__in=subevents)
+    mapping = category_mapping(event) if copy_mapping else None
+
+    total = qs.count()
+    failed = []
+    with language(locale, event.settings.region):
+        for done, subevent in enumerate(qs.iterator(), start=1):
+            try:
+                apply_subevent_seating_plan(subevent, plan, mapping)
+            except SeatProtected as e:
+                failed.append("{}: {}".format(subevent, e))
+            except Exception:
+                logger.exception(
+                    "Applying seating plan %s to subevent %s failed",
+                    plan.pk,
+                    subevent.pk,
+                )
+                failed.append(
+                    "{}: {}".format(subevent, _("An unexpected error occurred."))
+                )
+            if not self.request.called_directly:
+                self.update_state(
+                    state="PROGRESS",
+                    meta={
+                        "value": round(done / total * 100),
+                        "rows": done,
+                        "total": total,
+                        "errors": len(failed),
+                    },
+                )
+    return {"total": total, "failed": failed}
+
+
+def _apply_to_event(
+    event: Event,
+    plan: SeatingPlan,
+    template: Optional[Event],
+    user: Optional[User],
+) -> list:
+    """
+    Applies a plan to one event of :func:`apply_to_events` and returns its
+    row of the report.
+    """
+    row = [event.slug, str(event.name)]
+    try:
+        with transaction.atomic():
+            if seats_in_use(event):
+                return row + ["skipped", "", "", "", _("Tickets already have seats.")]
+            # Seats take their product from the mapping, so it is copied first
+            unmapped = copy_mapping(template, event) if template else []
+            diff = apply_seating_plan(event, plan)
+            event.log_action(
+                "pretix_manualseats.seatingplan.applied",
+                user=user,
+                data={
+                    "seatingplan": plan.pk,
+                    "template": template.pk if template else None,
+                    **diff.as_dict(),
+                },
+            )
+    except SeatProtected as e:
+        return row + ["failed", "", "", "", str(e)]
+    except Exception:
+        logger.exception(
+            "Applying seating plan %s to event %s failed", plan.pk, event.pk
+        )
+        return row + ["failed", "", "", "", _("An unexpected error occurred.")]
+
+    details = ""
+    if unmapped:
+        details = _("No product for categories: {categories}").format(
+            categories=", ".join(unmapped)
+        )
+    return row + [
+        "applied",
+        len(diff.create),
+        diff.updated,
+        len(diff.delete),
+        details,
+    ]
+
+
+@app.task(base=OrganizerUserTask, bind=True)
+def apply_to_events(
+    self,
+    organizer: Organizer,
+    user: Optional[User],
+    plan: int,
+    events: List[int],
+    template: Optional[int],
+    locale: str,
+    report: str,
+) -> dict:
+    """
+    Applies a seating plan to many events of an organizer in the background
+    and copies the category mapping of a template event to them, matching
+    products by name. Every event is handled in its own transaction by one of
+    at most :data:`EVENT_WORKERS` threads. Events whose tickets already have
+    seats are skipped, events that fail are reported without affecting the
+    others. Returns the number of events by result and writes the result of
+    every event to the ``report`` file.
+    """
+    plan = SeatingPlan.objects.get(organizer=organizer, pk=plan)
+    template = Event.objects.get(organizer=organizer, pk=template) if template else None
+    workers = 1 if connection.vendor == "sqlite" else EVENT_WORKERS
+    # Parsed once for all workers
+    get_layout(plan)
+
+    def run(event_id: int) -> list:
+        try:
+            with scope(organizer=organizer), language(
+                locale, organizer.settings.region
+            ):
+                event = Event.objects.get(organizer=organizer, pk=event_id)
+                return _apply_to_event(event, plan, template, user)
+        finally:
+            # Threads open connections of their own
+            if workers > 1:
+                connection.close()
+
+    rows = []
+    counts = {"applied": 0, "skipped": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(run, events) if workers > 1 else map(run, events)
+        for done, row in enumerate(results, start=1):
+            rows.append(row)
+            counts[row[2]] += 1
+            if not self.request.called_directly:
+                self.update_state(
+                    state="PROGRESS",
+                    meta={
+                        "value": round(done / len(events) * 100),
+                        "rows": done,
+                        "total": len(events),
+                        "errors": counts["skipped"] + counts["failed"],
+                    },
+                )
+
+    report = CachedFile.objects.get(pk=report, filename=EVENTS_REPORT)
+    _write_csv(
+        report,
+        ["event", "name", "result", "created", "updated", "deleted", "details"],
+        rows,
+    )
+    return {"total": len(events), "report": str(report.id), **counts}
@@ -1,6 +1,8 @@
 from django.urls import path
+from pretix.api.urls import event_router
 
 from . import views
+from .api import SeatAssignmentViewSet
 
 urlpatterns = [
     path(
@@ -18,6 +20,51 @@ urlpatterns = [
         views.EventAssign.as_view(),
         name="assign",
     ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/assign/upload/",
+        views.EventAssignUpload.as_view(),
+        name="assign.upload",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/assign/upload/<uuid:file>/",
+        views.EventAssignUploadProcess.as_view(),
+        name="assign.upload.process",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/assign/seats/",
+        views.EventAssignmentList.as_view(),
+        name="assignments",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/assign/seats/save/",
+        views.EventAssignmentSave.as_view(),
+        name="assignments.save",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/allocate/",
+        views.EventAllocate.as_view(),
+        name="allocate",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/subevents/",
+        views.EventSubEventSetup.as_view(),
+        name="subevents",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/copy/",
+        views.EventCopy.as_view(),
+        name="copy",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/seatmap/",
+        views.EventSeatMap.as_view(),
+        name="seatmap",
+    ),
+    path(
+        "control/event/<str:organizer>/<str:event>/manualseats/seatmap.svg",
+        views.EventSeatMapImage.as_view(),
+        name="seatmap.svg",
+    ),
     path(
         "control/organizer/<str:organizer>/manualseats/",
         views.OrganizerSeatingPlanList.as_view(),
@@ -33,9 +80,28 @@ urlpatterns = [
         views.OrganizerPlanEdit.as_view(),
         name="edit",
     ),
+    path(
+        "control/organizer/<str:organizer>/manualseats/<int:seatingplan>/layout",
+        views.OrganizerPlanLayout.as_view(),
+        name="layout",
+    ),
+    path(
+        "control/organizer/<str:organizer>/manualseats/<int:seatingplan>/apply",
+        views.OrganizerPlanApply.as_view(),
+        name="apply",
+    ),
     path(
         "control/organizer/<str:organizer>/manualseats/<int:seatingplan>/delete",
         views.OrganizerPlanDelete.as_view(),
         name="delete",
     ),
+    path(
+        "control/global/manualseats/profiling/",
+        views.ProfilingPanel.as_view(),
+        name="profiling",
+    ),
 ]
+
+event_router.register(
+    "manualseats/assignments", SeatAssignmentViewSet, basename="manualseats-assignments"
+)
@@ -1,34 +1,111 @@
 import typing
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import gzip
+import io
+import json
+from celery.result import AsyncResult
+from datetime import datetime, timedelta
 from django import forms
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Count
+from django.db.models import Count, Exists, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.forms.forms import BaseForm
 from django.forms.models import BaseModelForm
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import method_decorator
 from django.utils.functional import cached_property
-from django.utils.translation import gettext_lazy as _
-from django.views.generic import CreateView, FormView, ListView, UpdateView
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from django.utils.timezone import now
+from django.utils.translation import get_language, gettext_lazy as _
+from django.views import View
+from django.views.decorators.gzip import gzip_page
+from django.views.generic import (
+    CreateView,
+    FormView,
+    ListView,
+    TemplateView,
+    UpdateView,
+)
 from pretix.base.forms import I18nModelForm
+from pretix.base.forms.widgets import DatePickerWidget
 from pretix.base.models import (
+    CachedFile,
     Event,
     Item,
+    LogEntry,
+    Order,
     OrderPosition,
     Seat,
     SeatCategoryMapping,
     SeatingPlan,
+    SubEvent,
 )
-from pretix.base.services.seating import generate_seats
+from pretix.base.models.seating import SeatingPlanLayoutValidator
+from pretix.base.services.seating import SeatProtected
+from pretix.base.views.tasks import RE_ASYNC_ID, AsyncAction
 from pretix.control.permissions import (
+    AdministratorPermissionRequiredMixin,
     EventPermissionRequiredMixin,
     OrganizerPermissionRequiredMixin,
 )
 from pretix.helpers.compat import CompatDeleteView
 from pretix.helpers.models import modelcopy
 
+from .allocation import SeatAllocator
+from .copy import POSITION_KEYS, AssignmentCopier
+from .exporters import SeatAssignmentExporter
+from .importer import (
+    ACTIVE,
+    ASYNC_ROW_THRESHOLD,
+    CONFLICT_REPORT,
+    ERROR_REPORT,
+    HEADER,
+    INLINE_ROW_LIMIT,
+    AssignmentDiff,
+    AssignmentOperation,
+    AssignmentRow,
+    SeatAssignmentImporter,
+    count_rows,
+    open_upload,
+    read_rows,
+)
+from .layout import get_layout, layout_hash, layouts
+from .occupancy import get_occupancy
+from .profiling import (
+    ENABLED as PROFILING_ENABLED,
+    get_recent_profiles,
+    instrument_view,
+)
+from .seatmap import (
+    BLOCKED_COLOR,
+    FREE_COLOR,
+    LOOKUP_LIMIT,
+    category_colors,
+    get_seat_map,
+    seat_map_key,
+)
+from .seats import (
+    ASYNC_SEAT_THRESHOLD,
+    SeatSynchronizer,
+    apply_seating_plan,
+    seats_in_use,
+)
+from .tasks import (
+    EVENTS_REPORT,
+    apply_to_events,
+    import_assignments,
+    set_seating_plan,
+    setup_subevents,
+)
+
 
 class EventSeatingPlanSetForm(forms.Form):
     seatingplan = forms.ChoiceField(required=False, label=_("Seating Plan"))
@@ -47,13 +124,21 @@ class EventSeatingPlanSetForm(forms.Form):
         fields = ["users_edit_seatingplan", "seatingplan"]
 
 
-class EventIndex(EventPermissionRequiredMixin, FormView):
+@instrument_view
+class EventIndex(EventPermissionRequiredMixin, AsyncAction, FormView):
     model = SeatingPlan
     template_name = "pretix_manualseats/event/index.html"
     permission = "can_change_orders"
     form_class = EventSeatingPlanSetForm
+    task = set_seating_plan
+    known_errortypes = ["SeatProtected"]
 
-    def get_success_url(self) -> str:
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return FormView.get(self, request, *args, **kwargs)
+
+    def get_success_url(self, value=None) -> str:
         return reverse(
             "plugins:pretix_manualseats:index",
             kwargs={
@@ -68,6 +153,7 @@ class EventIndex(EventPermissionRequiredMixin, FormView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx["seatingplans"] = self.get_seatingplans()
+        ctx["occupancy"] = get_occupancy(self.get_event())
 
         return ctx
 
@@ -95,29 +181,36 @@ class EventIndex(EventPermissionRequiredMixin, FormView):
         return form
 
     def seats_in_use(self):
-        return OrderPosition.objects.filter(
-            order__event=self.get_event(), seat__isnull=False
-        ).exists()
+        return seats_in_use(self.get_event())
+
+    def get_error_url(self) -> str:
+        return self.get_success_url()
+
+    def get_success_message(self, value):
+        return _("Your changes have been saved.")
 
     def form_valid(self, form):
         seatingplan_id = form.cleaned_data["seatingplan"]
 
         event = self.get_event()
+        plan = None
         if seatingplan_id:
-            event.seating_plan = SeatingPlan.objects.get(id=seatingplan_id)
+            plan = get_object_or_404(self.get_seatingplans(), id=seatingplan_id)
             event.settings.seating_choice = form.cleaned_data["users_edit_seatingplan"]
-        else:
-            if event.seating_plan:
-                event.seating_plan = None
 
-        event.save()
+        if self.seats_in_use():
+            # The plan can not be changed any more, see get_form
+            messages.success(self.request, _("Your changes have been saved."))
+            return super().form_valid(form)
+
+        if plan and len(get_layout(plan).seats) > ASYNC_SEAT_THRESHOLD:
+            return self.do(event.pk, plan.pk, get_language())
 
-        if not self.seats_in_use():
-            if event.seating_plan:
-                generate_seats(event, None, event.seating_plan, dict(), None)
-            else:
-                SeatCategoryMapping.objects.filter(event=event).delete()
-                Seat.objects.filter(event=event).delete()
+        try:
+            apply_seating_plan(event, plan)
+        except SeatProtected as e:
+            messages.error(self.request, str(e))
+            return self.form_invalid(form)
 
         messages.success(self.request, _("Your changes have been saved."))
 
@@ -128,6 +221,7 @@ class EventMappingForm(forms.Form):
     pass
 
 
+@instrument_view
 class EventMapping(EventPermissionRequiredMixin, FormView):
     template_name = "pretix_manualseats/event/mapping.html"
     permission = "can_change_orders"
@@ -149,10 +243,9 @@ class EventMapping(EventPermissionRequiredMixin, FormView):
         ctx = super().get_context_data(**kwargs)
         ctx["seatingplan"] = self.get_seating_plan()
         if self.get_seating_plan():
-            ctx["seatingcats"] = [
-                c.name for c in self.get_seating_plan().get_categories()
-            ]
-        ctx["items"] = self.get_event().items.all()
+            ctx["seatingcats"] = [c.name for c in self.get_categories()]
+        ctx["items"] = self.items
+        ctx["occupancy"] = get_occupancy(self.get_event())
 
         return ctx
 
@@ -162,73 +255,122 @@ class EventMapping(EventPermissionRequiredMixin, FormView):
     def get_seating_plan(self) -> Event:
         return self.get_event().seating_plan
 
+    def get_categories(self) -> List[SeatingPlan.Category]:
+        if not self.get_seating_plan():
+            return []
+        return get_layout(self.get_seating_plan()).categories
+
+    @cached_property
+    def items(self) -> List[Item]:
+        return list(self.get_event().items.all())
+
+    @cached_property
+    def mappings(self) -> Dict[str, SeatCategoryMapping]:
+        mappings = {}
+        for mapping in SeatCategoryMapping.objects.filter(
+            event=self.get_event(), subevent__isnull=True
+        ).order_by("pk"):
+            mappings.setdefault(mapping.layout_category, mapping)
+        return mappings
+
     def get_initial(self) -> Dict[str, Any]:
         initial = super().get_initial()
 
-        event = self.get_event()
-
-        if self.get_seating_plan():
-            for cat in self.get_seating_plan().get_categories():
-                mapping = SeatCategoryMapping.objects.filter(
-                    event=event, layout_category=cat.name
-                ).first()
-                if mapping:
-                    initial[f"cat-{cat.name}"] = mapping.product.id
+        for cat in self.get_categories():
+            mapping = self.mappings.get(cat.name)
+            if mapping:
+                initial[f"cat-{cat.name}"] = mapping.product_id
 
         return initial
 
     def get_form(self, form_class=None) -> BaseForm:
         form = typing.cast(EventSeatingPlanSetForm, super().get_form(form_class))
 
-        if self.get_seating_plan():
-            for cat in self.get_seating_plan().get_categories():
-                form.fields[f"cat-{cat.name}"] = forms.ChoiceField(
-                    label=cat.name,
-                    choices=[(i.id, i.name) for i in self.get_event().items.all()]
-                    + [(None, _("None"))],
-                    required=False,
-                )
+        # Choices are validated against this list, so the selected products
+        # do not need to be looked up again when the form is saved.
+        choices = [(i.id, i.name) for i in self.items] + [(None, _("None"))]
+        for cat in self.get_categories():
+            form.fields[f"cat-{cat.name}"] = forms.ChoiceField(
+                label=cat.name,
+                choices=choices,
+                required=False,
+            )
 
         return form
 
+    @transaction.atomic
     def form_valid(self, form: BaseForm) -> HttpResponse:
         event = self.get_event()
-        SeatCategoryMapping.objects.filter(event=event).delete()
-
-        if self.get_seating_plan():
-            for cat in self.get_seating_plan().get_categories():
-                if form.cleaned_data[f"cat-{cat.name}"]:
-                    product = Item.objects.filter(
-                        id=form.cleaned_data[f"cat-{cat.name}"]
-                    ).first()
-                    queryset = SeatCategoryMapping.objects.create(
+        items = {str(i.pk): i for i in self.items}
+
+        keep = set()
+        create = []
+        update = []
+        for cat in self.get_categories():
+            product = items.get(form.cleaned_data[f"cat-{cat.name}"])
+            if not product:
+                continue
+            mapping = self.mappings.get(cat.name)
+            if mapping is None:
+                create.append(
+                    SeatCategoryMapping(
                         event=event, layout_category=cat.name, product=product
                     )
-                    queryset.save()
+                )
+                continue
+            keep.add(mapping.pk)
+            if mapping.product_id != product.pk:
+                mapping.product = product
+                update.append(mapping)
+
+        SeatCategoryMapping.objects.filter(event=event, subevent__isnull=True).exclude(
+            pk__in=keep
+        ).delete()
+        SeatCategoryMapping.objects.bulk_update(update, ["product"])
+        SeatCategoryMapping.objects.bulk_create(create)
+        # Seats take their product from the mapping
+        if event.seating_plan:
+            SeatSynchronizer(event, event.seating_plan).run()
 
         messages.success(self.request, _("Your changes have been saved."))
 
         return super().form_valid(form)
 
 
+COLUMNS_HELP = _(
+    "Header should equal <code>seat_guid,orderposition_secret</code>. Instead "
+    "of <code>seat_guid</code>, seats can be given as <code>zone,row,"
+    "seat_number</code>. Instead of <code>orderposition_secret</code>, tickets "
+    "can be given as <code>order_code,positionid</code> or "
+    "<code>attendee_email</code>."
+)
+
+
 class EventAssignForm(forms.Form):
     data = forms.CharField(
         widget=forms.Textarea(),
         label=_("Raw Data"),
-        help_text=_("Header should equal")
-        + ": <code>seat_guid,orderposition_secret</code>",
+        help_text=COLUMNS_HELP,
         required=False,
     )
 
     pass
 
 
-class EventAssign(EventPermissionRequiredMixin, FormView):
-    template_name = "pretix_manualseats/event/assign.html"
-    permission = "can_change_orders"
-    form_class = EventAssignForm
+class EventAssignUploadForm(forms.Form):
+    file = forms.FileField(
+        label=_("CSV file"),
+        help_text=COLUMNS_HELP,
+    )
 
-    def get_success_url(self) -> str:
+
+class SeatAssignmentImportMixin:
+    max_error_messages = 10
+
+    def get_event(self) -> Event:
+        return self.request.event
+
+    def get_assign_url(self) -> str:
         return reverse(
             "plugins:pretix_manualseats:assign",
             kwargs={
@@ -237,88 +379,942 @@ class EventAssign(EventPermissionRequiredMixin, FormView):
             },
         )
 
+    def report_errors(self, error: ValidationError):
+        errors = error.messages
+        for message in errors[: self.max_error_messages]:
+            messages.error(self.request, message)
+        if len(errors) > self.max_error_messages:
+            messages.error(
+                self.request,
+                _("{count} more rows could not be imported.").format(
+                    count=len(errors) - self.max_error_messages
+                ),
+            )
+
+    def report_conflicts(self, count: int, sample: List[str]):
+        messages.warning(
+            self.request,
+            _(
+                "{count} changes have been skipped since the tickets or seats "
+                "have been changed in the meantime, e.g. by an online sale. All "
+                "other changes have been saved."
+            ).format(count=count),
+        )
+        for message in sample[: self.max_error_messages]:
+            messages.warning(self.request, message)
+
+    def get_diff(self, rows: Iterable[AssignmentRow]) -> Optional[AssignmentDiff]:
+        if not self.get_event().seating_plan:
+            messages.error(self.request, _("No seating plan"))
+            return None
+
+        importer = SeatAssignmentImporter(self.get_event())
+        try:
+            return importer.diff(importer.resolve(rows))
+        except ValidationError as e:
+            self.report_errors(e)
+            return None
+
+    def apply_diff(self, diff: AssignmentDiff):
+        conflicts = SeatAssignmentImporter(
+            self.get_event(), user=self.request.user
+        ).apply(diff)
+        if conflicts:
+            self.report_conflicts(len(conflicts), conflicts)
+            return
+        messages.success(
+            self.request,
+            _(
+                "Your changes have been saved. {added} seats have been assigned, "
+                "{moved} moved and {removed} removed."
+            ).format(added=diff.added, moved=diff.moved, removed=diff.removed),
+        )
+
+
+@instrument_view
+class EventAssign(EventPermissionRequiredMixin, SeatAssignmentImportMixin, FormView):
+    template_name = "pretix_manualseats/event/assign.html"
+    permission = "can_change_orders"
+    form_class = EventAssignForm
+
+    def get_success_url(self) -> str:
+        return self.get_assign_url()
+
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         ctx["seatingplan"] = self.get_seating_plan()
         if self.get_seating_plan():
             ctx["seatingcats"] = [
-                c.name for c in self.get_seating_plan().get_categories()
+                c.name for c in get_layout(self.get_seating_plan()).categories
             ]
         ctx["items"] = self.get_event().items.all()
-        ctx["seats"] = Seat.objects.filter(event=self.get_event())
+        ctx["occupancy"] = get_occupancy(self.get_event())
+        ctx["upload_form"] = EventAssignUploadForm()
+        ctx["report"] = self.get_report()
+        ctx["conflict_report"] = (
+            ctx["report"] is not None and ctx["report"].filename == CONFLICT_REPORT
+        )
+        ctx["inline"] = self.inline_assignments is not None
+        ctx["exporter"] = SeatAssignmentExporter.identifier
 
         return ctx
 
-    def get_event(self) -> Event:
-        return self.request.event
-
     def get_seating_plan(self) -> Event:
         return self.get_event().seating_plan
 
+    def get_report(self) -> Optional[CachedFile]:
+        try:
+            report = CachedFile.objects.get(
+                pk=self.request.GET.get("report"),
+                filename__in=(ERROR_REPORT, CONFLICT_REPORT),
+            )
+        except (CachedFile.DoesNotExist, ValueError, ValidationError):
+            return None
+        return report if report.allowed_for_session(self.request) else None
+
+    @cached_property
+    def inline_assignments(self) -> Optional[List[Tuple[str, str]]]:
+        """
+        The current assignments if there are few enough of them to be edited
+        in the textarea, otherwise ``None``.
+        """
+        assignments = list(
+            OrderPosition.objects.filter(
+                order__event=self.get_event(),
+                order__status__in=ACTIVE,
+                seat__isnull=False,
+            ).values_list("seat__seat_guid", "secret")[: INLINE_ROW_LIMIT + 1]
+        )
+        if len(assignments) > INLINE_ROW_LIMIT:
+            return None
+        return assignments
+
     def get_initial(self) -> Dict[str, Any]:
         initial = super().get_initial()
 
-        orderpositions_with_seats = OrderPosition.objects.filter(
-            order__event=self.get_event(), seat__isnull=False
-        )
-        if orderpositions_with_seats:
-            initial["data"] = "seat_guid,orderposition_secret\n" + "\n".join(
-                [
-                    pos.seat.seat_guid + "," + pos.secret
-                    for pos in orderpositions_with_seats.select_related("seat")
-                ]
+        if self.inline_assignments:
+            initial["data"] = "\n".join(
+                [HEADER] + [",".join(a) for a in self.inline_assignments]
             )
 
         return initial
 
     def form_valid(self, form: BaseForm) -> HttpResponse:
-        event = self.get_event()
-
-        if not event.seating_plan:
-            messages.error(self.request, _("No seating plan"))
+        if self.inline_assignments is None:
+            messages.error(
+                self.request,
+                _(
+                    "This event has too many seat assignments to edit them here. "
+                    "Please upload a CSV file instead."
+                ),
+            )
             return super().form_invalid(form)
 
         data = typing.cast(str, form.cleaned_data["data"])
-        lines = data.split("\n")
-        lines = [line.strip() for line in lines]
+        diff = self.get_diff(read_rows(io.StringIO(data, newline="")))
+        if diff is None:
+            return super().form_invalid(form)
 
-        if len(lines) <= 1:
-            OrderPosition.objects.filter(order__event=event).update(seat=None)
-            messages.success(self.request, _("Removed all seat assignments."))
+        if not diff.changes:
+            messages.info(self.request, _("The seat assignments are unchanged."))
             return super().form_valid(form)
 
-        if not (lines[0].startswith("seat_guid,orderposition_secret")):
+        if "confirm" not in self.request.POST:
+            return self.render_to_response(self.get_context_data(form=form, diff=diff))
+
+        self.apply_diff(diff)
+        return super().form_valid(form)
+
+
+class AssignmentFilterForm(forms.Form):
+    STATUS_ASSIGNED = "assigned"
+    STATUS_FREE = "free"
+    STATUS_BLOCKED = "blocked"
+
+    zone = forms.ChoiceField(label=_("Zone"), required=False)
+    row = forms.CharField(label=_("Row"), required=False)
+    category = forms.ChoiceField(label=_("Category"), required=False)
+    order = forms.CharField(label=_("Order code"), required=False)
+    status = forms.ChoiceField(
+        label=_("Status"),
+        required=False,
+        choices=[
+            ("", _("All seats")),
+            (STATUS_ASSIGNED, _("Assigned")),
+            (STATUS_FREE, _("Free")),
+            (STATUS_BLOCKED, _("Blocked")),
+        ],
+    )
+
+    def __init__(self, *args, event: Event, layout, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.event = event
+        self.layout = layout
+        self.fields["zone"].choices = [("", _("All zones"))] + [
+            (z, z) for z in layout.zones
+        ]
+        self.fields["category"].choices = [("", _("All categories"))] + [
+            (c.name, c.name) for c in layout.categories
+        ]
+
+    def filter_qs(self, qs):
+        """
+        Filters seats of the event. Every filter is a condition on indexed
+        seat columns or a subquery on indexed position columns.
+        """
+        if not self.is_valid():
+            return qs
+        fdata = self.cleaned_data
+        assigned = (
+            OrderPosition.objects.filter(order__event=self.event, seat__isnull=False)
+            .exclude(order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED))
+            .values("seat_id")
+        )
+
+        if fdata.get("zone"):
+            qs = qs.filter(zone_name=fdata["zone"])
+        if fdata.get("row"):
+            qs = qs.filter(row_name=fdata["row"].strip())
+        if fdata.get("category"):
+            rows, guids = self.layout.category_seats(fdata["category"])
+            q = Q(seat_guid__in=guids)
+            for zone, names in rows.items():
+                q |= Q(zone_name=zone, row_name__in=names)
+            qs = qs.filter(q)
+        if fdata.get("order"):
+            qs = qs.filter(
+                pk__in=assigned.filter(order__code__iexact=fdata["order"].strip())
+            )
+        if fdata.get("status") == self.STATUS_ASSIGNED:
+            qs = qs.filter(pk__in=assigned)
+        elif fdata.get("status") == self.STATUS_FREE:
+            qs = qs.filter(blocked=False).exclude(pk__in=assigned)
+        elif fdata.get("status") == self.STATUS_BLOCKED:
+            qs = qs.filter(blocked=True).exclude(pk__in=assigned)
+        return qs
+
+
+@instrument_view
+class EventAssignmentList(EventPermissionRequiredMixin, ListView):
+    template_name = "pretix_manualseats/event/assignments.html"
+    permission = "can_change_orders"
+    context_object_name = "seats"
+    paginate_by = 50
+
+    @cached_property
+    def filter_form(self):
+        return AssignmentFilterForm(
+            data=self.request.GET,
+            event=self.request.event,
+            layout=get_layout(self.request.event.seating_plan),
+        )
+
+    def get_queryset(self):
+        if not self.request.event.seating_plan:
+            return Seat.objects.none()
+        qs = Seat.objects.filter(event=self.request.event, subevent__isnull=True)
+        return self.filter_form.filter_qs(qs).order_by("sorting_rank", "seat_guid")
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        plan = self.request.event.seating_plan
+        ctx["seatingplan"] = plan
+        if not plan:
+            return ctx
+
+        seats = ctx["seats"]
+        positions = {
+            p.seat_id: p
+            for p in OrderPosition.objects.filter(
+                order__event=self.request.event, seat__in=seats
+            )
+            .exclude(order__status__in=(Order.STATUS_CANCELED, Order.STATUS_EXPIRED))
+            .select_related("order")
+        }
+        layout = get_layout(plan)
+        for seat in seats:
+            seat.position = positions.get(seat.pk)
+            raw = layout.by_guid.get(seat.seat_guid)
+            seat.category = raw.category if raw else ""
+        ctx["filter_form"] = self.filter_form
+        return ctx
+
+
+@instrument_view
+class EventAssignmentSave(EventPermissionRequiredMixin, View):
+    """
+    Assigns a single seat to a ticket, given by its secret or as order code
+    and position id, or frees the seat if no ticket is given. Answers with
+    JSON for requests made by the assignment list and redirects back to the
+    list otherwise.
+    """
+
+    permission = "can_change_orders"
+
+    def get_position(self, ticket: str) -> Optional[OrderPosition]:
+        code, _sep, positionid = ticket.rpartition("-")
+        qs = OrderPosition.objects.filter(order__event=self.request.event)
+        if code and positionid.isdigit():
+            position = qs.filter(
+                order__code__iexact=code, positionid=int(positionid)
+            ).first()
+            if position:
+                return position
+        return qs.filter(secret=ticket).first()
+
+    def save(self, guid: str, ticket: str) -> Tuple[Seat, Optional[OrderPosition]]:
+        """
+        Changes the assignment of the seat and returns the seat with its new
+        position. Raises ``ValidationError`` if the change is not possible.
+        """
+        seat = Seat.objects.filter(
+            event=self.request.event, subevent__isnull=True, seat_guid=guid
+        ).first()
+        if not seat:
+            raise ValidationError(_("Unable to match seat ({guid}).").format(guid=guid))
+        position = None
+        if ticket:
+            position = self.get_position(ticket)
+            if not position:
+                raise ValidationError(
+                    _("Unable to match order ({secret}).").format(secret=ticket)
+                )
+
+        # The seat is freed first, so it can be given to another ticket
+        holders = OrderPosition.objects.filter(
+            order__event=self.request.event, order__status__in=ACTIVE, seat=seat
+        )
+        if position:
+            holders = holders.exclude(pk=position.pk)
+        operations = [
+            AssignmentOperation(i, "delete", guid, secret)
+            for i, secret in enumerate(holders.values_list("secret", flat=True))
+        ]
+        if position:
+            operations.append(
+                AssignmentOperation(len(operations), "upsert", guid, position.secret)
+            )
+        if not operations:
+            return seat, position
+
+        importer = SeatAssignmentImporter(self.request.event, user=self.request.user)
+        with transaction.atomic():
+            diff, errors = importer.resolve_operations(operations)
+            if errors:
+                raise ValidationError([str(e) for i, e in errors])
+            conflicts = importer.apply(diff, atomic=True)
+            if conflicts:
+                raise ValidationError(conflicts)
+        return seat, position
+
+    def post(self, request, *args, **kwargs):
+        guid = request.POST.get("seat", "")
+        ticket = request.POST.get("ticket", "").strip()
+        ajax = request.headers.get("x-requested-with") == "XMLHttpRequest"
+        try:
+            seat, position = self.save(guid, ticket)
+        except ValidationError as e:
+            if ajax:
+                return JsonResponse({"error": " ".join(e.messages)}, status=400)
+            for message in e.messages:
+                messages.error(request, message)
+        else:
+            if ajax:
+                return JsonResponse(
+                    {
+                        "seat": guid,
+                        "status": (
+                            AssignmentFilterForm.STATUS_ASSIGNED
+                            if position
+                            else (
+                                AssignmentFilterForm.STATUS_BLOCKED
+                                if seat.blocked
+                                else AssignmentFilterForm.STATUS_FREE
+                            )
+                        ),
+                        "position": (
+                            {
+                                "order": position.order.code,
+                                "positionid": position.positionid,
+                                "attendee": position.attendee_name or "",
+                                "url": reverse(
+                                    "control:event.order",
+                                    kwargs={
+                                        "organizer": request.organizer.slug,
+                                        "event": request.event.slug,
+                                        "code": position.order.code,
+                                    },
+                                ),
+                            }
+                            if position
+                            else None
+                        ),
+                    }
+                )
+            messages.success(request, _("Your changes have been saved."))
+
+        url = reverse(
+            "plugins:pretix_manualseats:assignments",
+            kwargs={"organizer": request.organizer.slug, "event": request.event.slug},
+        )
+        return redirect(url + ("?" + request.GET.urlencode() if request.GET else ""))
+
+
+@instrument_view
+class EventAssignUpload(EventPermissionRequiredMixin, SeatAssignmentImportMixin, View):
+    permission = "can_change_orders"
+
+    def post(self, request, *args, **kwargs):
+        form = EventAssignUploadForm(data=request.POST, files=request.FILES)
+        if not form.is_valid():
+            messages.error(request, _("Please select a CSV file to upload."))
+            return redirect(self.get_assign_url())
+
+        cf = CachedFile.objects.create(
+            expires=now() + timedelta(days=1),
+            date=now(),
+            filename="assignment.csv",
+            type="text/csv",
+            web_download=False,
+        )
+        cf.bind_to_session(request, "manualseats")
+        cf.file.save("assignment.csv", form.cleaned_data["file"])
+
+        return redirect(
+            reverse(
+                "plugins:pretix_manualseats:assign.upload.process",
+                kwargs={
+                    "organizer": self.get_event().organizer.slug,
+                    "event": self.get_event().slug,
+                    "file": cf.id,
+                },
+            )
+        )
+
+
+class ProgressAsyncMixin:
+    """
+    Shows the ``rows``, ``total`` and ``errors`` reported by a running task,
+    labelled by ``progress_labels``.
+    """
+
+    progress_template = "pretix_manualseats/progress.html"
+    progress_labels: Dict[str, str] = {}
+
+    def get_progress_context(self) -> Dict[str, Any]:
+        return {}
+
+    def get_result(self, request):
+        async_id = request.GET.get("async_id", "")
+        if "ajax" in request.GET or not RE_ASYNC_ID.match(async_id):
+            return super().get_result(request)
+
+        res = AsyncResult(async_id)
+        if res.ready():
+            return super().get_result(request)
+
+        return render(
+            request,
+            self.progress_template,
+            {
+                **self.get_progress_context(),
+                "labels": self.progress_labels,
+                "started": res.state in ("PROGRESS", "STARTED"),
+                "progress": res.info if isinstance(res.info, dict) else {},
+            },
+        )
+
+    def _ajax_response_data(self, value):
+        return value if isinstance(value, dict) else {}
+
+
+@instrument_view
+class EventAssignUploadProcess(
+    EventPermissionRequiredMixin,
+    SeatAssignmentImportMixin,
+    ProgressAsyncMixin,
+    AsyncAction,
+    TemplateView,
+):
+    template_name = "pretix_manualseats/event/assign_upload.html"
+    permission = "can_change_orders"
+    task = import_assignments
+    known_errortypes = ["ValidationError"]
+    progress_labels = {
+        "title": _("Seat Assignment"),
+        "legend": _("Importing seat assignments"),
+        "processed": _("Rows processed"),
+        "errors": _("Errors"),
+        "waiting": _("Your import is waiting to be processed."),
+        "running": _(
+            "This page refreshes automatically. You can leave it and continue "
+            "working, the import keeps running."
+        ),
+    }
+
+    @cached_property
+    def file(self) -> CachedFile:
+        cf = get_object_or_404(
+            CachedFile, pk=self.kwargs.get("file"), filename="assignment.csv"
+        )
+        if not cf.allowed_for_session(self.request, "manualseats"):
+            raise Http404()
+        return cf
+
+    @cached_property
+    def row_count(self) -> int:
+        self.file.file.open("rb")
+        return count_rows(self.file.file)
+
+    @property
+    def run_async(self) -> bool:
+        return self.row_count > ASYNC_ROW_THRESHOLD
+
+    def get_rows(self) -> Iterator[AssignmentRow]:
+        self.file.file.open("rb")
+        return read_rows(open_upload(self.file.file))
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+
+        if self.run_async:
+            return self.render_to_response(
+                self.get_context_data(row_count=self.row_count)
+            )
+
+        diff = self.get_diff(self.get_rows())
+        if diff is None:
+            return redirect(self.get_assign_url())
+
+        if not diff.changes:
+            messages.info(request, _("The seat assignments are unchanged."))
+            return redirect(self.get_assign_url())
+
+        return self.render_to_response(self.get_context_data(diff=diff))
+
+    def post(self, request, *args, **kwargs):
+        if self.run_async:
+            return self.do(
+                self.get_event().pk,
+                str(self.file.id),
+                get_language(),
+                self.file.session_key_for_request(request),
+                user=request.user.pk,
+            )
+
+        diff = self.get_diff(self.get_rows())
+        if diff is not None:
+            self.apply_diff(diff)
+            self.file.delete()
+        return redirect(self.get_assign_url())
+
+    def success(self, value):
+        if value.get("errors"):
             messages.error(
                 self.request,
                 _(
-                    "The CSV input format is invalid. Please check if you have included the headers."
-                ),
+                    "{count} rows could not be imported. No changes have been saved."
+                ).format(count=value["errors"]),
+            )
+            return redirect(self.get_assign_url() + "?report=" + value["report"])
+        if value.get("conflicts"):
+            self.report_conflicts(value["conflicts"], value["conflict_sample"])
+            return redirect(self.get_assign_url() + "?report=" + value["report"])
+        return super().success(value)
+
+    def get_success_message(self, value):
+        return _(
+            "Your changes have been saved. {added} seats have been assigned, "
+            "{moved} moved and {removed} removed."
+        ).format(
+            added=value.get("added", 0),
+            moved=value.get("moved", 0),
+            removed=value.get("removed", 0),
+        )
+
+    def get_success_url(self, value):
+        return self.get_assign_url()
+
+    def get_error_url(self):
+        return self.get_assign_url()
+
+
+@instrument_view
+class EventAllocate(EventPermissionRequiredMixin, SeatAssignmentImportMixin, FormView):
+    template_name = "pretix_manualseats/event/allocate.html"
+    permission = "can_change_orders"
+    form_class = forms.Form
+
+    def get_success_url(self) -> str:
+        return self.get_assign_url()
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["seatingplan"] = self.get_event().seating_plan
+        ctx["occupancy"] = get_occupancy(self.get_event())
+        return ctx
+
+    def form_valid(self, form):
+        plan = self.get_event().seating_plan
+        if not plan:
+            messages.error(self.request, _("No seating plan"))
+            return super().form_invalid(form)
+
+        result = SeatAllocator(self.get_event(), plan).allocate()
+        diff = result.as_diff()
+        if not diff.changes:
+            messages.info(
+                self.request,
+                _("There are no tickets without a seat that could be placed."),
             )
             return super().form_invalid(form)
 
-        for line in lines[1:]:
-            (seat_guid, orderposition_secret) = [
-                line.strip() for line in line.split(",")
-            ]
-            order = OrderPosition.objects.filter(secret=orderposition_secret).first()
-            seat = Seat.objects.filter(seat_guid=seat_guid).first()
-            if not order:
-                messages.error(
-                    self.request, _(f"Unable to match order ({orderposition_secret}).")
+        if "confirm" not in self.request.POST:
+            return self.render_to_response(
+                self.get_context_data(
+                    form=form, diff=diff, unassigned=len(result.unassigned)
                 )
-                return super().form_invalid(form)
-            if not seat:
-                messages.error(self.request, _(f"Unable to match seat ({seat_guid})."))
-                return super().form_invalid(form)
+            )
 
-            order.seat = seat
-            order.save()
+        self.apply_diff(diff)
+        return super().form_valid(form)
+
+
+def count_subquery(queryset, field: str) -> Coalesce:
+    """
+    Counts the objects of ``queryset`` referencing the outer object through
+    ``field`` in a correlated subquery.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(c=Count("*"))
+            .values("c"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
 
-        messages.success(self.request, _("Your changes have been saved."))
 
+class SubEventSetupForm(forms.Form):
+    seatingplan = forms.ModelChoiceField(
+        queryset=SeatingPlan.objects.none(), label=_("Seating Plan")
+    )
+    all_subevents = forms.BooleanField(label=_("All dates"), required=False)
+    subevents = forms.ModelMultipleChoiceField(
+        queryset=SubEvent.objects.none(),
+        label=_("Dates"),
+        required=False,
+        widget=forms.SelectMultiple(attrs={"size": 15}),
+    )
+    copy_mapping = forms.BooleanField(
+        label=_("Copy category mapping"),
+        help_text=_(
+            "Replaces the category mapping of the selected dates with the one of the event."
+        ),
+        required=False,
+        initial=True,
+    )
+
+    def __init__(self, *args, event: Event, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["seatingplan"].queryset = SeatingPlan.objects.filter(
+            organizer=event.organizer
+        )
+        self.fields["subevents"].queryset = event.subevents.order_by("date_from")
+
+    def clean(self):
+        data = super().clean()
+        if not data.get("all_subevents") and not data.get("subevents"):
+            raise ValidationError(_("Please select at least one date."))
+        return data
+
+
+@instrument_view
+class EventSubEventSetup(
+    EventPermissionRequiredMixin, ProgressAsyncMixin, AsyncAction, FormView
+):
+    template_name = "pretix_manualseats/event/subevents.html"
+    permission = "can_change_orders"
+    form_class = SubEventSetupForm
+    task = setup_subevents
+    progress_labels = {
+        "title": _("Dates"),
+        "legend": _("Applying the seating plan"),
+        "processed": _("Dates processed"),
+        "errors": _("Skipped"),
+    }
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.event.has_subevents:
+            raise Http404(_("This event is not an event series."))
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return FormView.get(self, request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["event"] = self.request.event
+        return kwargs
+
+    def get_success_url(self, value=None) -> str:
+        return reverse(
+            "plugins:pretix_manualseats:subevents",
+            kwargs={
+                "organizer": self.request.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+    def get_error_url(self) -> str:
+        return self.get_success_url()
+
+    def form_valid(self, form):
+        subevents = None
+        if not form.cleaned_data["all_subevents"]:
+            subevents = [s.pk for s in form.cleaned_data["subevents"]]
+        return self.do(
+            self.request.event.pk,
+            form.cleaned_data["seatingplan"].pk,
+            subevents,
+            form.cleaned_data["copy_mapping"],
+            get_language(),
+        )
+
+    def success(self, value):
+        if value["failed"]:
+            messages.warning(
+                self.request,
+                _(
+                    "The seating plan could not be applied to {count} dates: {dates}"
+                ).format(
+                    count=len(value["failed"]), dates="; ".join(value["failed"][:10])
+                ),
+            )
+        return super().success(value)
+
+    def get_success_message(self, value):
+        return _("The seating plan has been applied to {count} dates.").format(
+            count=value["total"] - len(value["failed"])
+        )
+
+
+class EventCopyForm(forms.Form):
+    source = forms.ModelChoiceField(
+        queryset=Event.objects.none(),
+        label=_("Copy from"),
+        help_text=_("Only events using the same seating plan can be selected."),
+    )
+    key = forms.ChoiceField(
+        label=_("Match tickets by"),
+        choices=[(k, v[0]) for k, v in POSITION_KEYS.items()],
+        help_text=_(
+            "Tickets whose value is missing or used by more than one ticket of "
+            "an event are not matched."
+        ),
+    )
+    copy_mapping = forms.BooleanField(
+        label=_("Copy category mapping"),
+        help_text=_(
+            "Replaces the category mapping of this event with the one of the "
+            "selected event. Products are matched by name."
+        ),
+        required=False,
+        initial=True,
+    )
+    copy_assignments = forms.BooleanField(
+        label=_("Copy seat assignments"),
+        help_text=_("Tickets that already have a seat are not changed."),
+        required=False,
+        initial=True,
+    )
+
+    def __init__(self, *args, events, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["source"].queryset = events
+
+    def clean(self):
+        data = super().clean()
+        if not data.get("copy_mapping") and not data.get("copy_assignments"):
+            raise ValidationError(_("Please select what should be copied."))
+        return data
+
+
+@instrument_view
+class EventCopy(EventPermissionRequiredMixin, FormView):
+    template_name = "pretix_manualseats/event/copy.html"
+    permission = "can_change_orders"
+    form_class = EventCopyForm
+
+    def get_events(self):
+        # Seats of event series belong to their dates, which are not copied.
+        if not self.request.event.seating_plan_id or self.request.event.has_subevents:
+            return Event.objects.none()
+        return (
+            self.request.user.get_events_with_permission(
+                "can_change_orders", self.request
+            )
+            .filter(
+                organizer=self.request.organizer,
+                seating_plan_id=self.request.event.seating_plan_id,
+                has_subevents=False,
+            )
+            .exclude(pk=self.request.event.pk)
+            .order_by("-date_from")
+        )
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["events"] = self.get_events()
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["seatingplan"] = self.request.event.seating_plan
+        return ctx
+
+    def get_success_url(self) -> str:
+        return reverse(
+            "plugins:pretix_manualseats:assign",
+            kwargs={
+                "organizer": self.request.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+    def form_valid(self, form):
+        source = form.cleaned_data["source"]
+        result = AssignmentCopier(
+            source,
+            self.request.event,
+            form.cleaned_data["key"],
+            user=self.request.user,
+        ).run(
+            mapping=form.cleaned_data["copy_mapping"],
+            assignments=form.cleaned_data["copy_assignments"],
+        )
+        self.request.event.log_action(
+            "pretix_manualseats.assignments.copied",
+            user=self.request.user,
+            data={
+                "source": source.pk,
+                "key": form.cleaned_data["key"],
+                "copied": result.copied,
+                "unmatched": result.unmatched,
+                "skipped": result.skipped,
+            },
+        )
+
+        if form.cleaned_data["copy_assignments"]:
+            messages.success(
+                self.request,
+                _("{count} seats have been assigned.").format(count=result.copied),
+            )
+        if result.skipped:
+            messages.warning(
+                self.request,
+                _(
+                    "{count} tickets have been skipped since they already have a "
+                    "seat or their seat is taken."
+                ).format(count=result.skipped),
+            )
+        if result.unmatched:
+            messages.warning(
+                self.request,
+                _(
+                    "{count} assigned tickets of {event} have no match in this "
+                    "event: {tickets}"
+                ).format(
+                    count=result.unmatched,
+                    event=source,
+                    tickets=", ".join(
+                        "{}-{} ({})".format(code, positionid, guid)
+                        for code, positionid, guid in result.sample
+                    ),
+                ),
+            )
+        if result.unmapped:
+            messages.warning(
+                self.request,
+                _(
+                    "The products of these categories do not exist in this event: "
+                    "{categories}"
+                ).format(categories=", ".join(result.unmapped)),
+            )
+        elif form.cleaned_data["copy_mapping"]:
+            messages.success(self.request, _("The category mapping has been copied."))
         return super().form_valid(form)
 
 
+@instrument_view
+class EventSeatMap(EventPermissionRequiredMixin, TemplateView):
+    template_name = "pretix_manualseats/event/seatmap.html"
+    permission = "can_view_orders"
+
+    def get_lookup(self) -> Optional[List[OrderPosition]]:
+        query = self.request.GET.get("query", "").strip()
+        if not query:
+            return None
+        return list(
+            OrderPosition.objects.filter(
+                Q(order__code__iexact=query)
+                | Q(seat__seat_guid=query)
+                | Q(attendee_name_cached__icontains=query),
+                order__event=self.request.event,
+                seat__isnull=False,
+            )
+            .select_related("order", "seat")
+            .order_by("order__code", "positionid")[:LOOKUP_LIMIT]
+        )
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        plan = self.request.event.seating_plan
+        ctx["seatingplan"] = plan
+        if plan:
+            ctx["categories"] = category_colors(get_layout(plan))
+        ctx["free_color"] = FREE_COLOR
+        ctx["blocked_color"] = BLOCKED_COLOR
+        ctx["query"] = self.request.GET.get("query", "")
+        ctx["lookup"] = self.get_lookup()
+        ctx["lookup_limit"] = LOOKUP_LIMIT
+        return ctx
+
+
+@instrument_view
+class EventSeatMapImage(EventPermissionRequiredMixin, View):
+    permission = "can_view_orders"
+
+    def get(self, request, *args, **kwargs):
+        plan = request.event.seating_plan
+        if not plan:
+            raise Http404()
+        layout = get_layout(plan)
+        key = seat_map_key(request.event, layout)
+        etag = quote_etag(layout_hash(key))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content = get_seat_map(request.event, layout, key)
+            # The map is cached compressed, most clients take it as it is.
+            if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+                response = HttpResponse(content, content_type="image/svg+xml")
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(
+                    gzip.decompress(content), content_type="image/svg+xml"
+                )
+        patch_vary_headers(response, ("Accept-Encoding",))
+        response["ETag"] = etag
+        return response
+
+
+@instrument_view
 class OrganizerSeatingPlanList(OrganizerPermissionRequiredMixin, ListView):
     model = SeatingPlan
     context_object_name = "seatingplans"
@@ -327,24 +1323,73 @@ class OrganizerSeatingPlanList(OrganizerPermissionRequiredMixin, ListView):
     permission = "can_change_organizer_settings"
 
     def get_queryset(self):
+        # Counted in separate subqueries, joining both relations would multiply
+        # the rows of events and subevents of every plan.
         return (
             SeatingPlan.objects.filter(organizer=self.request.organizer)
             .order_by("id")
-            .annotate(eventcount=Count("events"), subeventcount=Count("subevents"))
+            .annotate(
+                eventcount=count_subquery(Event.objects, "seating_plan"),
+                subeventcount=count_subquery(SubEvent.objects, "seating_plan"),
+            )
         )
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["report"] = self.get_report()
+        return ctx
+
+    def get_report(self) -> Optional[CachedFile]:
+        try:
+            report = CachedFile.objects.get(
+                pk=self.request.GET.get("report"), filename=EVENTS_REPORT
+            )
+        except (CachedFile.DoesNotExist, ValueError, ValidationError):
+            return None
+        return report if report.allowed_for_session(self.request) else None
+
 
 class SeatingPlanForm(I18nModelForm):
+    layout_file = forms.FileField(
+        label=_("Layout"),
+        required=False,
+        help_text=_("A seating plan file in JSON format."),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields["layout_file"].required = not self.instance.layout
 
     class Meta:
         model = SeatingPlan
-        fields = ("name", "layout")
+        fields = ("name",)
+
+    def clean_layout_file(self) -> Optional[str]:
+        f = self.cleaned_data.get("layout_file")
+        if not f:
+            return None
+        try:
+            data = json.load(open_upload(f))
+        except (ValueError, UnicodeDecodeError):
+            raise ValidationError(_("Your layout file is not a valid JSON file."))
+        SeatingPlanLayoutValidator()(data)
+        return json.dumps(data)
+
+    def save(self, commit=True):
+        if self.cleaned_data.get("layout_file"):
+            self.instance.layout = self.cleaned_data["layout_file"]
+        return super().save(commit)
+
+    def get_log_data(self) -> Dict[str, Any]:
+        data = {"name": self.cleaned_data["name"]}
+        if self.cleaned_data.get("layout_file"):
+            data["layout"] = layout_hash(self.cleaned_data["layout_file"])
+        return data
 
 
 class SeatingPlanDetailMixin:
-    def get_object(self, queryset=None) -> SeatingPlan:
+    @cached_property
+    def seatingplan(self) -> SeatingPlan:
         try:
             return SeatingPlan.objects.get(
                 organizer=self.request.organizer, id=self.kwargs["seatingplan"]
@@ -352,16 +1397,21 @@ class SeatingPlanDetailMixin:
         except SeatingPlan.DoesNotExist:
             raise Http404(_("The requested seating plan does not exist."))
 
+    def get_object(self, queryset=None) -> SeatingPlan:
+        return self.seatingplan
+
     def get_success_url(self) -> str:
         return reverse(
             "plugins:pretix_manualseats:index",
             kwargs={"organizer": self.request.organizer.slug},
         )
 
+    @cached_property
     def is_in_use(self) -> bool:
-        return self.get_object().events.exists() or self.get_object().subevents.exists()
+        return self.seatingplan.events.exists() or self.seatingplan.subevents.exists()
 
 
+@instrument_view
 class OrganizerPlanAdd(OrganizerPermissionRequiredMixin, CreateView):
     model = SeatingPlan
     form_class = SeatingPlanForm
@@ -386,7 +1436,7 @@ class OrganizerPlanAdd(OrganizerPermissionRequiredMixin, CreateView):
         ret = super().form_valid(form)
         form.instance.log_action(
             "pretix_seatingplan.seatingplan.added",
-            data=dict(form.cleaned_data),
+            data=form.get_log_data(),
             user=self.request.user,
         )
         self.request.organizer.cache.clear()
@@ -421,6 +1471,7 @@ class OrganizerPlanAdd(OrganizerPermissionRequiredMixin, CreateView):
         return kwargs
 
 
+@instrument_view
 class OrganizerPlanEdit(
     OrganizerPermissionRequiredMixin, SeatingPlanDetailMixin, UpdateView
 ):
@@ -440,19 +1491,19 @@ class OrganizerPlanEdit(
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data()
 
-        self.get_object()
-
-        ctx["inuse"] = self.is_in_use()
+        ctx["inuse"] = self.is_in_use
+        ctx["layout"] = get_layout(self.object)
+        ctx["layout_length"] = len(self.object.layout)
 
         return ctx
 
     def get_form(self, form_class: type[BaseModelForm] | None = None) -> BaseModelForm:
         form = super().get_form(form_class)
 
-        form.fields["layout"].disabled = self.is_in_use()
+        form.fields["layout_file"].disabled = self.is_in_use
 
-        if self.is_in_use():
-            form.fields["layout"].help_text = _(
+        if self.is_in_use:
+            form.fields["layout_file"].help_text = _(
                 "You cannot change this plan any more since it is already used in at least one of your events. Please create a copy instead."
             )
 
@@ -460,11 +1511,7 @@ class OrganizerPlanEdit(
 
     @transaction.atomic
     def form_valid(self, form):
-        if (
-            self.is_in_use()
-            and self.request.POST.get("layout")
-            and self.get_object().layout != self.request.POST["layout"]
-        ):
+        if self.is_in_use and self.request.FILES.get("layout_file"):
             messages.error(
                 self.request,
                 _("Your changes could not be saved. The plan already is in use."),
@@ -473,10 +1520,13 @@ class OrganizerPlanEdit(
 
         messages.success(self.request, _("Your changes have been saved."))
 
+        if "layout_file" in form.changed_data:
+            layouts.invalidate(self.object.layout)
+
         if form.has_changed():
             self.object.log_action(
                 "pretix_seatingplan.seatingplan.changed",
-                data=dict(form.cleaned_data),
+                data=form.get_log_data(),
                 user=self.request.user,
             )
 
@@ -488,6 +1538,232 @@ class OrganizerPlanEdit(
         return super().form_invalid(form)
 
 
+# Number of matching events listed before a plan is applied to them
+PREVIEW_LIMIT = 100
+
+
+class PlanApplyForm(forms.Form):
+    query = forms.CharField(label=_("Event name or short form"), required=False)
+    date_from = forms.DateField(
+        label=_("Events starting on or after"),
+        required=False,
+        widget=DatePickerWidget(),
+    )
+    date_until = forms.DateField(
+        label=_("Events starting on or before"),
+        required=False,
+        widget=DatePickerWidget(),
+    )
+    without_plan = forms.BooleanField(
+        label=_("Only events without a seating plan"), required=False
+    )
+    template = forms.ModelChoiceField(
+        queryset=Event.objects.none(),
+        label=_("Copy category mapping from"),
+        help_text=_(
+            "Replaces the category mapping of the events with the one of the "
+            "selected event. Products are matched by name. Only events using "
+            "this seating plan can be selected."
+        ),
+        required=False,
+    )
+
+    def __init__(self, *args, templates, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["template"].queryset = templates
+
+    def filter(self, events):
+        data = self.cleaned_data
+        if data["query"]:
+            events = events.filter(
+                Q(name__icontains=data["query"]) | Q(slug__icontains=data["query"])
+            )
+        if data["date_from"]:
+            events = events.filter(date_from__date__gte=data["date_from"])
+        if data["date_until"]:
+            events = events.filter(date_from__date__lte=data["date_until"])
+        if data["without_plan"]:
+            events = events.filter(seating_plan__isnull=True)
+        return events
+
+
+@instrument_view
+class OrganizerPlanApply(
+    OrganizerPermissionRequiredMixin,
+    SeatingPlanDetailMixin,
+    ProgressAsyncMixin,
+    AsyncAction,
+    FormView,
+):
+    template_name = "pretix_manualseats/organizer/apply.html"
+    permission = "can_change_organizer_settings"
+    form_class = PlanApplyForm
+    task = apply_to_events
+    progress_labels = {
+        "title": _("Apply Seating Plan"),
+        "legend": _("Applying the seating plan"),
+        "processed": _("Events processed"),
+        "errors": _("Skipped"),
+    }
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return FormView.get(self, request, *args, **kwargs)
+
+    def get_progress_context(self):
+        return {"seatingplan": self.seatingplan}
+
+    def get_events(self):
+        # Seats of event series belong to their dates, which are set up on the
+        # page of the series.
+        return self.request.user.get_events_with_permission(
+            "can_change_orders", self.request
+        ).filter(organizer=self.request.organizer, has_subevents=False)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["templates"] = (
+            self.get_events()
+            .filter(
+                seating_plan=self.seatingplan,
+                pk__in=SeatCategoryMapping.objects.filter(subevent__isnull=True).values(
+                    "event_id"
+                ),
+            )
+            .order_by("-date_from")
+        )
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["seatingplan"] = self.seatingplan
+        return ctx
+
+    def get_success_url(self, value=None) -> str:
+        url = super().get_success_url()
+        if value and value.get("report"):
+            url += "?report=" + value["report"]
+        return url
+
+    def get_error_url(self) -> str:
+        return reverse(
+            "plugins:pretix_manualseats:apply",
+            kwargs={
+                "organizer": self.request.organizer.slug,
+                "seatingplan": self.seatingplan.pk,
+            },
+        )
+
+    def form_valid(self, form):
+        events = form.filter(self.get_events()).order_by("date_from", "pk")
+        count = events.count()
+        if not count:
+            messages.info(self.request, _("No event matches your filters."))
+            return self.form_invalid(form)
+
+        if "confirm" not in self.request.POST:
+            preview = events.annotate(
+                in_use=Exists(
+                    OrderPosition.objects.filter(
+                        order__event=OuterRef("pk"), seat__isnull=False
+                    )
+                )
+            ).select_related("organizer", "seating_plan")
+            return self.render_to_response(
+                self.get_context_data(
+                    form=form,
+                    events=preview[:PREVIEW_LIMIT],
+                    count=count,
+                    in_use=preview.filter(in_use=True).count(),
+                )
+            )
+
+        template = form.cleaned_data["template"]
+        report = CachedFile(
+            expires=now() + timedelta(days=1),
+            date=now(),
+            filename=EVENTS_REPORT,
+            type="text/csv",
+            web_download=False,
+        )
+        report.bind_to_session(self.request)
+        report.save()
+        return self.do(
+            organizer=self.request.organizer.pk,
+            user=self.request.user.pk,
+            plan=self.seatingplan.pk,
+            events=list(events.values_list("pk", flat=True)),
+            template=template.pk if template else None,
+            locale=get_language(),
+            report=str(report.id),
+        )
+
+    def success(self, value):
+        if value["skipped"]:
+            messages.warning(
+                self.request,
+                _(
+                    "{count} events have been skipped since their tickets already "
+                    "have seats. The report lists the result of every event."
+                ).format(count=value["skipped"]),
+            )
+        if value["failed"]:
+            messages.warning(
+                self.request,
+                _(
+                    "The seating plan could not be applied to {count} events. The "
+                    "report lists the reason for every event."
+                ).format(count=value["failed"]),
+            )
+        return super().success(value)
+
+    def get_success_message(self, value):
+        return _("The seating plan has been applied to {count} events.").format(
+            count=value["applied"]
+        )
+
+
+@instrument_view
+@method_decorator(gzip_page, name="dispatch")
+class OrganizerPlanLayout(
+    OrganizerPermissionRequiredMixin, SeatingPlanDetailMixin, View
+):
+    permission = "can_change_organizer_settings"
+
+    def get_last_modified(self) -> Optional[datetime]:
+        return (
+            LogEntry.objects.filter(
+                content_type=ContentType.objects.get_for_model(SeatingPlan),
+                object_id=self.seatingplan.pk,
+            )
+            .order_by()
+            .aggregate(m=Max("datetime"))["m"]
+        )
+
+    def get(self, request, *args, **kwargs):
+        layout = get_layout(self.seatingplan)
+        etag = quote_etag(layout.hash)
+        last_modified = self.get_last_modified()
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is None:
+            response = HttpResponse(
+                self.seatingplan.layout, content_type="application/json"
+            )
+            response["Content-Disposition"] = content_disposition_header(
+                True, "{}.json".format(layout.name or "seatingplan")
+            )
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        return response
+
+
+@instrument_view
 class OrganizerPlanDelete(
     OrganizerPermissionRequiredMixin, SeatingPlanDetailMixin, CompatDeleteView
 ):
@@ -499,13 +1775,13 @@ class OrganizerPlanDelete(
     def get_context_data(self, **kwargs: Any):
         ctx = super().get_context_data(**kwargs)
 
-        ctx["inuse"] = self.is_in_use()
+        ctx["inuse"] = self.is_in_use
 
         return ctx
 
     @transaction.atomic
     def delete(self, request, *args, **kwargs):
-        if self.is_in_use():
+        if self.is_in_use:
             messages.error(
                 self.request,
                 _(
@@ -519,6 +1795,34 @@ class OrganizerPlanDelete(
             "pretix_manualseats.seatingplan.deleted", user=self.request.user
         )
         self.object.delete()
+        layouts.invalidate(self.object.layout)
         messages.success(request, _("The selected plan has been deleted."))
         self.request.organizer.cache.clear()
         return HttpResponseRedirect(self.get_success_url())
+
+
+class ProfilingPanel(AdministratorPermissionRequiredMixin, TemplateView):
+    template_name = "pretix_manualseats/profiling.html"
+
+    def get_context_data(self, **kwargs: Any):
+        ctx = super().get_context_data(**kwargs)
+        profiles = get_recent_profiles()
+
+        summary: Dict[str, List[dict]] = {}
+        for p in profiles:
+            summary.setdefault(p["name"], []).append(p)
+        ctx["summary"] = [
+            {
+                "name": name,
+                "count": len(entries),
+                "queries": max(p["queries"] for p in entries),
+                "query_ms": max(p["query_ms"] for p in entries),
+                "layout_ms": max(p["layout_ms"] for p in entries),
+                "rows": max(p["rows"] for p in entries),
+                "total_ms": max(p["total_ms"] for p in entries),
+            }
+            for name, entries in sorted(summary.items())
+        ]
+        ctx["profiles"] = profiles
+        ctx["enabled"] = PROFILING_ENABLED
+        return ctx
@@ -1 +1,275 @@
-# put your pytest fixtures here
+from typing import Optional
+
+import json
+import os
+import pytest
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_scopes import scopes_disabled
+from pretix.base.models import (
+    Event,
+    Order,
+    OrderPosition,
+    Organizer,
+    SeatingPlan,
+    Team,
+    User,
+)
+
+from pretix_manualseats.seats import SeatSynchronizer
+
+# Sizes of the synthetic events used by the benchmarks. Larger sizes can be
+# enabled with e.g. MANUALSEATS_BENCHMARK_SIZES=1000,10000,100000.
+BENCHMARK_SIZES = [
+    int(s)
+    for s in os.environ.get("MANUALSEATS_BENCHMARK_SIZES", "1000").split(",")
+    if s.strip()
+]
+SEATS_PER_ROW = 50
+ROWS_PER_ZONE = 40
+CATEGORIES = 12
+PRODUCTS = 24
+# Size of the synthetic event used by functional tests
+SMALL_SIZE = 100
+
+
+def build_layout(seats: int, categories: int = CATEGORIES) -> str:
+    """
+    Builds a seating plan layout with the given number of seats, split into
+    zones of rows. Categories change every few rows.
+    """
+    zones = []
+    for z in range(0, seats, SEATS_PER_ROW * ROWS_PER_ZONE):
+        rows = []
+        for r in range(z, min(z + SEATS_PER_ROW * ROWS_PER_ZONE, seats), SEATS_PER_ROW):
+            row_number = (r - z) // SEATS_PER_ROW + 1
+            category = "Category {}".format((r // (SEATS_PER_ROW * 3)) % categories)
+            rows.append(
+                {
+                    "row_number": str(row_number),
+                    "position": {"x": 0, "y": row_number * 10},
+                    "seats": [
+                        {
+                            "seat_guid": "seat-{}".format(s),
+                            "seat_number": str(s - r + 1),
+                            "category": category,
+                            "position": {"x": (s - r) * 10, "y": 0},
+                        }
+                        for s in range(r, min(r + SEATS_PER_ROW, seats))
+                    ],
+                }
+            )
+        zones.append(
+            {
+                "name": "Zone {}".format(len(zones) + 1),
+                "position": {"x": 0, "y": len(zones) * 500},
+                "rows": rows,
+            }
+        )
+    return json.dumps(
+        {
+            "name": "Synthetic {}".format(seats),
+            "categories": [
+                {"name": "Category {}".format(c), "color": "#000000"}
+                for c in range(categories)
+            ],
+            "zones": zones,
+            "size": {"width": SEATS_PER_ROW * 10, "height": len(zones) * 500},
+        }
+    )
+
+
+class SyntheticEvent:
+    """
+    An organizer with an event, a seating plan with ``size`` seats, many
+    products and ``size`` paid order positions without seats.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.organizer = Organizer.objects.create(name="Bench", slug="bench")
+        self.event = Event.objects.create(
+            organizer=self.organizer,
+            name="Bench",
+            slug="bench",
+            date_from=datetime(2030, 1, 1, tzinfo=timezone.utc),
+            plugins="pretix_manualseats",
+        )
+        self.plan = SeatingPlan.objects.create(
+            organizer=self.organizer, name="Bench", layout=build_layout(size)
+        )
+        self.event.seating_plan = self.plan
+        self.event.save()
+        SeatSynchronizer(self.event, self.plan).run()
+
+        self.items = [
+            self.event.items.create(
+                name="Product {}".format(i), default_price=Decimal("10.00")
+            )
+            for i in range(PRODUCTS)
+        ]
+        self.create_orders(self.event, self.items, "B", "secret-{}")
+
+        self.user = User.objects.create_user("bench@example.org", "bench")
+        team = Team.objects.create(
+            organizer=self.organizer,
+            all_events=True,
+            all_event_permissions=True,
+            all_organizer_permissions=True,
+        )
+        team.members.add(self.user)
+
+    def create_orders(
+        self,
+        event: Event,
+        items: list,
+        prefix: str,
+        secret: str,
+        attendee_email: Optional[str] = None,
+    ):
+        """
+        Creates ``size`` paid orders with one position each. ``secret`` and
+        ``attendee_email`` are formatted with the number of the order.
+        """
+        orders = Order.objects.bulk_create(
+            Order(
+                organizer=self.organizer,
+                event=event,
+                code="{}{:06d}".format(prefix, i),
+                email="bench@example.org",
+                status=Order.STATUS_PAID,
+                total=Decimal("10.00"),
+                datetime=datetime(2029, 1, 1, tzinfo=timezone.utc),
+                expires=datetime(2029, 1, 1, tzinfo=timezone.utc),
+                sales_channel=self.organizer.sales_channels.get(identifier="web"),
+            )
+            for i in range(self.size)
+        )
+        OrderPosition.all.bulk_create(
+            (
+                OrderPosition(
+                    order=order,
+                    organizer=self.organizer,
+                    item=items[i % len(items)],
+                    price=Decimal("10.00"),
+                    tax_rate=Decimal("0.00"),
+                    tax_value=Decimal("0.00"),
+                    positionid=1,
+                    secret=secret.format(i),
+                    pseudonymization_id="{}{:09d}".format(prefix, i),
+                    attendee_email=attendee_email.format(i) if attendee_email else None,
+                )
+                for i, order in enumerate(orders)
+            ),
+            batch_size=5000,
+        )
+
+    def add_event(self, slug: str) -> Event:
+        """
+        Creates another event on the same plan with one product and ``size``
+        paid positions without seats. The attendee emails of its positions
+        are built from the secrets of this event, e.g. ``secret-0@example.org``.
+        """
+        event = Event.objects.create(
+            organizer=self.organizer,
+            name=slug.title(),
+            slug=slug,
+            date_from=datetime(2030, 2, 1, tzinfo=timezone.utc),
+            plugins="pretix_manualseats",
+            seating_plan=self.plan,
+        )
+        SeatSynchronizer(event, self.plan).run()
+        item = event.items.create(name="Product 0", default_price=Decimal("10.00"))
+        self.create_orders(
+            event, [item], slug[0].upper(), slug + "-{}", "secret-{}@example.org"
+        )
+        return event
+
+    def seat(self, secret: str, guid: str) -> OrderPosition:
+        """
+        Gives the position with the given secret the seat with the given guid.
+        """
+        with scopes_disabled():
+            position = OrderPosition.objects.get(order__event=self.event, secret=secret)
+            position.seat = self.event.seats.get(seat_guid=guid)
+            position.save()
+            return position
+
+    def seats(self) -> dict:
+        """
+        The seat guid of every seated position, by secret.
+        """
+        with scopes_disabled():
+            return dict(
+                OrderPosition.objects.filter(
+                    order__event=self.event, seat__isnull=False
+                ).values_list("secret", "seat__seat_guid")
+            )
+
+    def assignments_csv(self, count=None) -> str:
+        count = self.size if count is None else count
+        return "seat_guid,orderposition_secret\n" + "".join(
+            "seat-{0},secret-{0}\n".format(i) for i in range(count)
+        )
+
+
+@pytest.fixture
+def make_layout():
+    return build_layout
+
+
+@pytest.fixture(params=BENCHMARK_SIZES, ids=lambda s: "{}seats".format(s))
+def synthetic(request, db):
+    with scopes_disabled():
+        return SyntheticEvent(request.param)
+
+
+@pytest.fixture
+def small(db):
+    with scopes_disabled():
+        return SyntheticEvent(SMALL_SIZE)
+
+
+class Measurement:
+    def __init__(self, name: str):
+        self.name = name
+        self.queries = 0
+        self.seconds = 0.0
+        self.peak_memory = 0
+
+    def __str__(self):
+        return "{}: {} queries, {:.3f} s, {:.1f} MiB peak".format(
+            self.name, self.queries, self.seconds, self.peak_memory / 1024 / 1024
+        )
+
+
+@pytest.fixture
+def measure(record_property):
+    """
+    Measures the wall time, peak memory allocated from Python and number of
+    SQL queries of a block. Results are printed and attached to the test
+    report.
+    """
+
+    @contextmanager
+    def measure(name: str):
+        m = Measurement(name)
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                yield m
+        finally:
+            m.seconds = time.perf_counter() - start
+            m.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        m.queries = len(ctx.captured_queries)
+        record_property(name, str(m))
+        print(m)
+
+    return measure
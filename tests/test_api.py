@@ -0,0 +1,163 @@
+import json
+import pytest
+from django_scopes import scopes_disabled
+from pretix.base.models import LogEntry, Order
+
+URL = "/api/v1/organizers/bench/events/bench/manualseats/assignments/batch/"
+
+
+@pytest.fixture
+def token(small):
+    with scopes_disabled():
+        return small.organizer.teams.get().tokens.create(name="API").token
+
+
+def post(client, token: str, data, content_type="application/json"):
+    if content_type == "application/x-ndjson":
+        data = "\n".join(json.dumps(o) for o in data)
+    return client.post(
+        URL, data, content_type=content_type, HTTP_AUTHORIZATION="Token " + token
+    )
+
+
+@pytest.mark.django_db
+def test_batch_json(client, small, token):
+    small.seat("secret-0", "seat-0")
+    response = post(
+        client,
+        token,
+        {
+            "upsert": [
+                {"seat_guid": "seat-1", "secret": "secret-0"},
+                {"seat_guid": "seat-2", "secret": "secret-1"},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"added": 1, "moved": 1, "removed": 0, "unchanged": 0}
+    assert small.seats() == {"secret-0": "seat-1", "secret-1": "seat-2"}
+
+
+@pytest.mark.django_db
+def test_batch_ndjson(client, small, token):
+    small.seat("secret-0", "seat-0")
+    response = post(
+        client,
+        token,
+        [
+            {"op": "delete", "seat_guid": "seat-0", "secret": "secret-0"},
+            {"op": "upsert", "seat_guid": "seat-0", "secret": "secret-1"},
+        ],
+        "application/x-ndjson",
+    )
+    assert response.status_code == 200
+    assert response.json() == {"added": 1, "moved": 0, "removed": 1, "unchanged": 0}
+    assert small.seats() == {"secret-1": "seat-0"}
+
+
+@pytest.mark.django_db
+def test_batch_ndjson_invalid(client, small, token):
+    response = client.post(
+        URL,
+        '{"op": "upsert", "seat_guid": "seat-0", "secret": "secret-0"}\n{',
+        content_type="application/x-ndjson",
+        HTTP_AUTHORIZATION="Token " + token,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 2 is not valid JSON")
+    assert small.seats() == {}
+
+
+@pytest.mark.django_db
+def test_batch_invalid_operation(client, small, token):
+    response = post(
+        client,
+        token,
+        [
+            {"op": "upsert", "seat_guid": "seat-0", "secret": "secret-0"},
+            {"op": "move", "seat_guid": "seat-1", "secret": "secret-1"},
+        ],
+    )
+    assert response.status_code == 400
+    assert response.json() == {"errors": [{"index": 1, "error": "Invalid operation."}]}
+    assert small.seats() == {}
+
+
+@pytest.mark.django_db
+def test_batch_errors(client, small, token):
+    small.seat("secret-0", "seat-0")
+    response = post(
+        client,
+        token,
+        [
+            {"op": "upsert", "seat_guid": "seat-1", "secret": "secret-1"},
+            {"op": "upsert", "seat_guid": "seat-x", "secret": "secret-2"},
+            {"op": "upsert", "seat_guid": "seat-0", "secret": "secret-3"},
+            {"op": "delete", "seat_guid": "seat-1", "secret": "secret-0"},
+        ],
+        "application/x-ndjson",
+    )
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {"index": 1, "error": "Unable to match seat (seat-x)."},
+            {"index": 2, "error": "Seat seat-0 is already assigned."},
+            {"index": 3, "error": "Seat seat-1 is not assigned to secret-0."},
+        ]
+    }
+    assert small.seats() == {"secret-0": "seat-0"}
+
+
+@pytest.mark.django_db
+def test_batch_conflict(client, small, token):
+    with scopes_disabled():
+        small.event.vouchers.create(
+            code="SEAT2",
+            item=small.items[0],
+            seat=small.event.seats.get(seat_guid="seat-2"),
+        )
+    response = post(
+        client,
+        token,
+        {
+            "upsert": [
+                {"seat_guid": "seat-1", "secret": "secret-0"},
+                {"seat_guid": "seat-2", "secret": "secret-1"},
+            ],
+        },
+    )
+    assert response.status_code == 409
+    assert response.json() == {
+        "errors": [
+            {
+                "error": "Seat seat-2 has been taken in the meantime and was not "
+                "assigned to secret-1."
+            }
+        ]
+    }
+    # Nothing of the batch is kept
+    assert small.seats() == {}
+    with scopes_disabled():
+        assert not LogEntry.objects.filter(
+            action_type="pretix.event.order.changed.seat"
+        ).exists()
+
+
+@pytest.mark.django_db
+def test_list(client, small, token):
+    small.seat("secret-0", "seat-0")
+    expired = small.seat("secret-1", "seat-1")
+    with scopes_disabled():
+        Order.objects.filter(pk=expired.order_id).update(status=Order.STATUS_EXPIRED)
+    response = client.get(
+        URL.replace("batch/", ""), HTTP_AUTHORIZATION="Token " + token
+    )
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {
+            "seat_guid": "seat-0",
+            "secret": "secret-0",
+            "order": "B000000",
+            "positionid": 1,
+        }
+    ]
@@ -0,0 +1,274 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django_scopes import scope, scopes_disabled
+from pretix.base.models import LogEntry, Order, OrderPosition, SeatCategoryMapping
+from pretix.base.services.locking import LockTimeoutException
+
+from pretix_manualseats import importer
+from pretix_manualseats.importer import SeatAssignmentImporter, read_rows
+
+
+def import_lines(small, *lines):
+    with scope(organizer=small.organizer):
+        return SeatAssignmentImporter(small.event).run(read_rows(lines))
+
+
+def import_errors(small, *lines):
+    with pytest.raises(ValidationError) as e:
+        import_lines(small, *lines)
+    return e.value.messages
+
+
+@pytest.mark.django_db
+def test_import(small):
+    small.seat("secret-0", "seat-0")
+    small.seat("secret-1", "seat-1")
+    conflicts = import_lines(
+        small,
+        "seat_guid,orderposition_secret",
+        "seat-1,secret-0",
+        "seat-0,secret-1",
+        "seat-5,secret-2",
+    )
+    assert conflicts == []
+    assert small.seats() == {
+        "secret-0": "seat-1",
+        "secret-1": "seat-0",
+        "secret-2": "seat-5",
+    }
+
+
+@pytest.mark.django_db
+def test_duplicate_seat(small):
+    assert import_errors(
+        small, "seat_guid,orderposition_secret", "seat-0,secret-0", "seat-0,secret-1"
+    ) == ["Seat seat-0 is assigned more than once (lines 2 and 3)."]
+    assert small.seats() == {}
+
+
+@pytest.mark.django_db
+def test_duplicate_position(small):
+    assert import_errors(
+        small, "seat_guid,orderposition_secret", "seat-0,secret-0", "seat-1,secret-0"
+    ) == ["Order (secret-0) is listed more than once (lines 2 and 3)."]
+
+
+@pytest.mark.django_db
+def test_unmatched(small):
+    assert import_errors(
+        small, "seat_guid,orderposition_secret", "seat-x,secret-0", "seat-1,secret-x"
+    ) == ["Unable to match seat (seat-x).", "Unable to match order (secret-x)."]
+
+
+@pytest.mark.django_db
+def test_category_mismatch(small):
+    with scopes_disabled():
+        SeatCategoryMapping.objects.create(
+            event=small.event, layout_category="Category 0", product=small.items[1]
+        )
+    # All seats of the small plan are in Category 0, secret-1 has Product 1
+    assert (
+        import_lines(small, "seat_guid,orderposition_secret", "seat-0,secret-1") == []
+    )
+    with scopes_disabled():
+        small.plan.layout = small.plan.layout.replace(
+            '"seat_guid": "seat-99", "seat_number": "50", "category": "Category 0"',
+            '"seat_guid": "seat-99", "seat_number": "50", "category": "Category 1"',
+        )
+        small.plan.save()
+    assert import_errors(
+        small, "seat_guid,orderposition_secret", "seat-99,secret-1"
+    ) == [
+        "Seat seat-99 in category Category 1 does not match the product of order "
+        "(secret-1)."
+    ]
+
+
+@pytest.mark.django_db
+def test_unlisted_holder(small):
+    small.seat("secret-0", "seat-0")
+    assert import_errors(
+        small, "seat_guid,orderposition_secret", "seat-0,secret-1"
+    ) == [
+        "Seat seat-0 is assigned to order (secret-0), which is not listed in the "
+        "file. Please remove that assignment first."
+    ]
+    assert small.seats() == {"secret-0": "seat-0"}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("status", [Order.STATUS_EXPIRED, Order.STATUS_CANCELED])
+def test_inactive_holder(small, status):
+    held = small.seat("secret-0", "seat-0")
+    with scopes_disabled():
+        Order.objects.filter(pk=held.order_id).update(status=status)
+    assert (
+        import_lines(small, "seat_guid,orderposition_secret", "seat-0,secret-1") == []
+    )
+    assert small.seats()["secret-1"] == "seat-0"
+
+
+@pytest.mark.django_db
+def test_inactive_holder_kept(small):
+    held = small.seat("secret-0", "seat-0")
+    with scopes_disabled():
+        Order.objects.filter(pk=held.order_id).update(status=Order.STATUS_EXPIRED)
+    assert (
+        import_lines(small, "seat_guid,orderposition_secret", "seat-1,secret-1") == []
+    )
+    assert small.seats() == {"secret-0": "seat-0", "secret-1": "seat-1"}
+    with scopes_disabled():
+        assert not LogEntry.objects.filter(
+            action_type="pretix.event.order.changed.seat", object_id=held.order_id
+        ).exists()
+
+
+def fail_locking(monkeypatch, calls: int):
+    """
+    Lets seat locks time out after the given number of successful calls.
+    """
+    lock_objects = importer.lock_objects
+
+    def lock(*args, **kwargs):
+        nonlocal calls
+        calls -= 1
+        if calls < 0:
+            raise LockTimeoutException()
+        return lock_objects(*args, **kwargs)
+
+    monkeypatch.setattr(importer, "lock_objects", lock)
+
+
+@pytest.mark.django_db
+def test_lock_timeout(small, monkeypatch):
+    monkeypatch.setattr(importer, "LOCK_BATCH_SIZE", 1)
+    fail_locking(monkeypatch, 1)
+    conflicts = import_lines(
+        small, "seat_guid,orderposition_secret", "seat-0,secret-0", "seat-1,secret-1"
+    )
+    assert conflicts == [
+        "The seats were in use by a checkout and the seat of secret-1 was not "
+        "updated. Please try again."
+    ]
+    assert small.seats() == {"secret-0": "seat-0"}
+
+
+@pytest.mark.django_db
+def test_lock_timeout_atomic(small, monkeypatch):
+    small.seat("secret-0", "seat-0")
+    fail_locking(monkeypatch, 0)
+    with scope(organizer=small.organizer):
+        i = SeatAssignmentImporter(small.event)
+        conflicts = i.apply(
+            i.diff(
+                i.resolve(
+                    read_rows(["seat_guid,orderposition_secret", "seat-1,secret-1"])
+                )
+            ),
+            atomic=True,
+        )
+    assert len(conflicts) == 2
+    assert small.seats() == {"secret-0": "seat-0"}
+
+
+@pytest.mark.django_db
+def test_lock_timeout_after_release(small, monkeypatch):
+    small.seat("secret-0", "seat-0")
+    small.seat("secret-1", "seat-1")
+    fail_locking(monkeypatch, 1)
+    conflicts = import_lines(
+        small, "seat_guid,orderposition_secret", "seat-1,secret-0", "seat-0,secret-1"
+    )
+    assert len(conflicts) == 2
+    assert "secret-0, which no longer has a seat." in conflicts[0]
+    assert small.seats() == {}
+    with scopes_disabled():
+        entries = LogEntry.objects.filter(action_type="pretix.event.order.changed.seat")
+        assert sorted(e.parsed_data["new_seat"] for e in entries) == ["-", "-"]
+
+
+def set_email(small, secret: str, email: str):
+    with scopes_disabled():
+        OrderPosition.objects.filter(order__event=small.event, secret=secret).update(
+            attendee_email=email
+        )
+
+
+@pytest.mark.django_db
+def test_seat_label(small):
+    assert (
+        import_lines(
+            small, "zone,row,seat_number,orderposition_secret", "Zone 1,2,2,secret-0"
+        )
+        == []
+    )
+    assert small.seats() == {"secret-0": "seat-51"}
+
+
+@pytest.mark.django_db
+def test_position_code(small):
+    assert (
+        import_lines(small, "seat_guid,order_code,positionid", "seat-0,b000001,1") == []
+    )
+    assert small.seats() == {"secret-1": "seat-0"}
+    assert import_errors(
+        small, "seat_guid,order_code,positionid", "seat-0,B000001,2"
+    ) == ["Unable to match order (B000001-2) in line 2."]
+
+
+@pytest.mark.django_db
+def test_attendee_email(small):
+    set_email(small, "secret-2", "Ann@Example.org")
+    assert (
+        import_lines(small, "seat_guid,attendee_email", "seat-0,ann@example.ORG") == []
+    )
+    assert small.seats() == {"secret-2": "seat-0"}
+
+
+@pytest.mark.django_db
+def test_ambiguous_seat_label(small):
+    with scopes_disabled():
+        small.plan.layout = small.plan.layout.replace(
+            '"seat_guid": "seat-1", "seat_number": "2"',
+            '"seat_guid": "seat-1", "seat_number": "1"',
+        )
+        small.plan.save()
+    assert import_errors(
+        small, "zone,row,seat_number,orderposition_secret", "Zone 1,1,1,secret-0"
+    ) == ["Seat Zone 1 / 1 / 1 is ambiguous, please use seat_guid (line 2)."]
+
+
+@pytest.mark.django_db
+def test_ambiguous_email(small):
+    set_email(small, "secret-0", "ann@example.org")
+    set_email(small, "secret-1", "ANN@example.org")
+    assert import_errors(
+        small, "seat_guid,attendee_email", "seat-0,ann@example.org"
+    ) == [
+        "The attendee email ann@example.org belongs to more than one ticket (line 2)."
+    ]
+
+
+@pytest.mark.django_db
+def test_email_of_canceled_order(small):
+    set_email(small, "secret-0", "ann@example.org")
+    set_email(small, "secret-1", "ann@example.org")
+    with scopes_disabled():
+        Order.objects.filter(event=small.event, code="B000000").update(
+            status=Order.STATUS_CANCELED
+        )
+    assert (
+        import_lines(small, "seat_guid,attendee_email", "seat-0,ann@example.org") == []
+    )
+    assert small.seats() == {"secret-1": "seat-0"}
+
+
+@pytest.mark.django_db
+def test_position_code_of_expired_order(small):
+    with scopes_disabled():
+        Order.objects.filter(event=small.event, code="B000001").update(
+            status=Order.STATUS_EXPIRED
+        )
+    assert import_errors(
+        small, "seat_guid,order_code,positionid", "seat-0,B000001,1"
+    ) == ["Unable to match order (B000001-1) in line 2."]
@@ -0,0 +1,40 @@
+import pytest
+from django_scopes import scope
+from pretix.base.models import SeatCategoryMapping
+
+from pretix_manualseats.occupancy import Occupancy, compute_occupancy
+from pretix_manualseats.seats import SeatSynchronizer
+
+
+def mix_first_row(small):
+    # seat-1 is the only seat of Category 1 in the first row
+    small.plan.layout = small.plan.layout.replace(
+        '"seat_guid": "seat-1", "seat_number": "2", "category": "Category 0"',
+        '"seat_guid": "seat-1", "seat_number": "2", "category": "Category 1"',
+    )
+    small.plan.save()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("mapped", [True, False])
+def test_mixed_row(small, mapped):
+    with scope(organizer=small.organizer):
+        mix_first_row(small)
+        if mapped:
+            for c in range(2):
+                SeatCategoryMapping.objects.create(
+                    event=small.event,
+                    layout_category="Category {}".format(c),
+                    product=small.items[c],
+                )
+        SeatSynchronizer(small.event, small.plan).run()
+        small.seat("secret-1", "seat-1")
+        small.event.seats.filter(seat_guid="seat-2").update(blocked=True)
+
+        occupancy = compute_occupancy(small.event)
+    assert dict(occupancy.categories) == {
+        "Category 0": Occupancy(free=small.size - 2, blocked=1),
+        "Category 1": Occupancy(assigned=1),
+    }
+    assert occupancy.zones == [("Zone 1", Occupancy(small.size - 2, 1, 1))]
+    assert occupancy.products == [("Product 1", 1)]
@@ -0,0 +1,299 @@
+import pytest
+from datetime import datetime, timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django_scopes import scopes_disabled
+from math import ceil
+from pretix.base.models import (
+    Event,
+    LogEntry,
+    OrderPosition,
+    SeatCategoryMapping,
+    SeatingPlan,
+)
+
+from pretix_manualseats.exporters import SeatAssignmentExporter
+from pretix_manualseats.importer import LOCK_BATCH_SIZE, WRITE_BATCH_SIZE
+
+# Number of events a seating plan is applied to at once
+EVENTS = 5
+
+
+def batches(size: int, batch_size: int = WRITE_BATCH_SIZE) -> int:
+    return ceil(size / batch_size)
+
+
+@pytest.fixture
+def client(client, synthetic):
+    client.login(email="bench@example.org", password="bench")
+    return client
+
+
+def event_url(name: str) -> str:
+    return "/control/event/bench/bench/manualseats/{}".format(name)
+
+
+@pytest.mark.django_db
+def test_assign_import(client, synthetic, measure):
+    upload = SimpleUploadedFile(
+        "seats.csv", synthetic.assignments_csv().encode(), content_type="text/csv"
+    )
+    response = client.post(event_url("assign/upload/"), {"file": upload})
+    assert response.status_code == 302
+
+    with measure("assign import") as m:
+        response = client.post(response["Location"])
+    assert response.status_code == 302
+    # Every chunk locks, checks and writes its seats and order log entries in a
+    # transaction of its own
+    assert m.queries <= 40 + 11 * batches(synthetic.size, LOCK_BATCH_SIZE)
+
+    with scopes_disabled():
+        assert (
+            OrderPosition.objects.filter(
+                order__event=synthetic.event, seat__isnull=False
+            ).count()
+            == synthetic.size
+        )
+        assert (
+            LogEntry.objects.filter(
+                event=synthetic.event, action_type="pretix.event.order.changed.seat"
+            ).count()
+            == synthetic.size
+        )
+
+
+@pytest.mark.django_db
+def test_assign_page(client, synthetic, measure):
+    with measure("assign page") as m:
+        response = client.get(event_url("assign/"))
+    assert response.status_code == 200
+    assert m.queries <= 50
+
+
+@pytest.mark.django_db
+def test_assign_export(synthetic, measure):
+    with scopes_disabled():
+        seats = dict(synthetic.event.seats.values_list("seat_guid", "pk"))
+        OrderPosition.all.bulk_update(
+            [
+                OrderPosition(pk=pk, seat_id=seats[secret.replace("secret", "seat")])
+                for pk, secret in OrderPosition.objects.filter(
+                    order__event=synthetic.event
+                ).values_list("pk", "secret")
+            ],
+            ["seat"],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+
+        exporter = SeatAssignmentExporter(synthetic.event, synthetic.organizer)
+        with measure("assign export") as m:
+            filename, content_type, content = exporter.render({"_format": "default"})
+    assert content.count(b"\n") == synthetic.size + 1
+    assert m.queries <= 10
+
+
+@pytest.mark.django_db
+def test_mapping(client, synthetic, measure):
+    with measure("mapping load") as m:
+        response = client.get(event_url("mapping/"))
+    assert response.status_code == 200
+    assert m.queries <= 40
+
+    data = {
+        "cat-Category {}".format(c): str(synthetic.items[c % len(synthetic.items)].pk)
+        for c in range(12)
+    }
+    with measure("mapping save") as m:
+        response = client.post(event_url("mapping/"), data)
+    assert response.status_code == 302
+    # The seats take the new products with one UPDATE per product
+    assert m.queries <= 40 + len(data)
+    with scopes_disabled():
+        assert SeatCategoryMapping.objects.filter(event=synthetic.event).count() == 12
+
+
+@pytest.mark.django_db
+def test_index_plan_switch(client, synthetic, measure, make_layout):
+    with scopes_disabled():
+        # Every tenth seat is removed, so seats are created, updated and deleted
+        plan = SeatingPlan.objects.create(
+            organizer=synthetic.organizer,
+            name="Changed",
+            layout=make_layout(synthetic.size + synthetic.size // 10, categories=5),
+        )
+
+    with measure("index plan switch") as m:
+        response = client.post(event_url(""), {"seatingplan": str(plan.pk)})
+    assert response.status_code == 302
+    assert m.queries <= 60 + 2 * batches(synthetic.size)
+    with scopes_disabled():
+        assert synthetic.event.seats.count() == synthetic.size + synthetic.size // 10
+
+    with measure("index unchanged plan") as m:
+        response = client.post(event_url(""), {"seatingplan": str(plan.pk)})
+    assert response.status_code == 302
+    assert m.queries <= 40
+
+
+@pytest.mark.django_db
+def test_organizer_plan_list(client, synthetic, measure, make_layout):
+    with scopes_disabled():
+        for i in range(20):
+            plan = SeatingPlan.objects.create(
+                organizer=synthetic.organizer,
+                name="Plan {}".format(i),
+                layout=make_layout(10),
+            )
+            event = Event.objects.create(
+                organizer=synthetic.organizer,
+                name="Series {}".format(i),
+                slug="series{}".format(i),
+                date_from=datetime(2030, 1, 1, tzinfo=timezone.utc),
+                has_subevents=True,
+                seating_plan=plan,
+            )
+            for d in range(5):
+                event.subevents.create(
+                    name="Date {}".format(d),
+                    date_from=datetime(2030, 1, 1 + d, tzinfo=timezone.utc),
+                    seating_plan=plan,
+                )
+
+    with measure("organizer plan list") as m:
+        response = client.get("/control/organizer/bench/manualseats/")
+    assert response.status_code == 200
+    plans = {p.name: p for p in response.context["seatingplans"]}
+    assert plans["Plan 3"].eventcount == 1
+    assert plans["Plan 3"].subeventcount == 5
+    assert m.queries <= 40
+
+
+@pytest.mark.django_db
+def test_copy_from_event(client, synthetic, measure):
+    with scopes_disabled():
+        seats = dict(synthetic.event.seats.values_list("seat_guid", "pk"))
+        OrderPosition.all.bulk_update(
+            [
+                OrderPosition(
+                    pk=pk,
+                    seat_id=seats[secret.replace("secret", "seat")],
+                    attendee_email="{}@example.org".format(secret),
+                )
+                for pk, secret in OrderPosition.objects.filter(
+                    order__event=synthetic.event
+                ).values_list("pk", "secret")
+            ],
+            ["seat", "attendee_email"],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+        event = synthetic.add_event("next")
+
+    with measure("copy from event") as m:
+        response = client.post(
+            "/control/event/bench/next/manualseats/copy/",
+            {
+                "source": str(synthetic.event.pk),
+                "key": "attendee_email",
+                "copy_mapping": "on",
+                "copy_assignments": "on",
+            },
+        )
+    assert response.status_code == 302
+    # Matching and writing are set-based, only the order log entries are
+    # written in batches. SQLite limits statements to 999 parameters, which
+    # splits the inserts of a batch further.
+    assert m.queries <= 40 + 20 * batches(synthetic.size)
+    with scopes_disabled():
+        assert (
+            OrderPosition.objects.filter(order__event=event, seat__isnull=False).count()
+            == synthetic.size
+        )
+
+
+@pytest.mark.django_db
+def test_seat_map(client, synthetic, measure, settings):
+    # The test settings use a dummy cache, which would never hit
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    with measure("seat map render") as m:
+        response = client.get(event_url("seatmap.svg"), HTTP_ACCEPT_ENCODING="gzip")
+    assert response.status_code == 200
+    assert m.queries <= 30
+
+    with measure("seat map cached") as m:
+        response = client.get(event_url("seatmap.svg"), HTTP_ACCEPT_ENCODING="gzip")
+    assert response.status_code == 200
+    assert m.queries <= 20
+
+    with measure("seat map not modified") as m:
+        response = client.get(
+            event_url("seatmap.svg"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_assignment_list(client, synthetic, measure):
+    with measure("assignment list") as m:
+        response = client.get(event_url("assign/seats/"))
+    assert response.status_code == 200
+    assert m.queries <= 40
+
+    with measure("assignment list filtered") as m:
+        response = client.get(
+            event_url("assign/seats/"),
+            {"zone": "Zone 1", "category": "Category 1", "status": "free", "page": 2},
+        )
+    assert response.status_code == 200
+    assert m.queries <= 40
+
+    with measure("assignment save") as m:
+        response = client.post(
+            event_url("assign/seats/save/"),
+            {"seat": "seat-0", "ticket": "B000000-1"},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+    assert response.status_code == 200
+    # A single change only touches its seat and ticket
+    assert m.queries <= 40
+
+
+@pytest.mark.django_db
+def test_apply_to_events(client, synthetic, measure):
+    with scopes_disabled():
+        events = [
+            Event.objects.create(
+                organizer=synthetic.organizer,
+                name="Show {}".format(i),
+                slug="show{}".format(i),
+                date_from=datetime(2030, 2, 1 + i, tzinfo=timezone.utc),
+                plugins="pretix_manualseats",
+            )
+            for i in range(EVENTS)
+        ]
+        for event in events:
+            event.items.create(name="Product 0", default_price=10)
+        SeatCategoryMapping.objects.create(
+            event=synthetic.event,
+            layout_category="Category 0",
+            product=synthetic.items[0],
+        )
+    url = "/control/organizer/bench/manualseats/{}/apply".format(synthetic.plan.pk)
+
+    with measure("apply to events preview") as m:
+        response = client.post(url, {"query": "show"})
+    assert response.status_code == 200
+    assert m.queries <= 40
+
+    with measure("apply to events") as m:
+        response = client.post(
+            url, {"query": "show", "template": synthetic.event.pk, "confirm": "1"}
+        )
+    assert response.status_code == 302
+    # Every event gets its seats in bulk. SQLite limits statements to 999
+    # parameters, which splits the inserts of a batch further.
+    assert m.queries <= 40 + EVENTS * (30 + 15 * batches(synthetic.size))
+    with scopes_disabled():
+        for event in events:
+            assert event.seats.count() == synthetic.size
@@ -0,0 +1,19 @@
+import pytest
+from django_scopes import scope
+from pretix.base.models import Order
+
+from pretix_manualseats.layout import get_layout
+from pretix_manualseats.seatmap import render_seat_map
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("status", [Order.STATUS_CANCELED, Order.STATUS_EXPIRED])
+def test_inactive_order(small, status):
+    small.seat("secret-0", "seat-0")
+    inactive = small.seat("secret-1", "seat-1")
+    with scope(organizer=small.organizer):
+        Order.objects.filter(pk=inactive.order_id).update(status=status)
+        svg = render_seat_map(small.event, get_layout(small.plan))
+    assert "B000000-1" in svg
+    assert "B000001-1" not in svg
+    assert 'class="c0 f" data-guid="seat-1"' in svg
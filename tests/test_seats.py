@@ -0,0 +1,64 @@
+import pytest
+from datetime import datetime, timezone
+from django_scopes import scope
+from pretix.base.models import Seat, SeatCategoryMapping
+
+from pretix_manualseats.copy import AssignmentCopier
+from pretix_manualseats.seats import SeatSynchronizer, apply_subevent_seating_plan
+
+
+def products(event, subevent=None):
+    return set(
+        Seat.objects.filter(event=event, subevent=subevent).values_list(
+            "product_id", flat=True
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_event_mapping(small):
+    product = small.items[0]
+    with scope(organizer=small.organizer):
+        assert products(small.event) == {None}
+        SeatCategoryMapping.objects.create(
+            event=small.event, layout_category="Category 0", product=product
+        )
+        diff = SeatSynchronizer(small.event, small.plan).run()
+        assert diff.updated == small.size
+        assert products(small.event) == {product.pk}
+
+
+@pytest.mark.django_db
+def test_subevent_mapping(small):
+    product = small.items[1]
+    with scope(organizer=small.organizer):
+        subevent = small.event.subevents.create(
+            name="Date", date_from=datetime(2030, 1, 2, tzinfo=timezone.utc)
+        )
+        apply_subevent_seating_plan(subevent, small.plan, {"Category 0": product.pk})
+        assert products(small.event, subevent) == {product.pk}
+        assert not SeatSynchronizer(small.event, small.plan, subevent).run()
+
+
+@pytest.mark.django_db
+def test_mapping_view(client, small):
+    product = small.items[2]
+    client.login(email="bench@example.org", password="bench")
+    response = client.post(
+        "/control/event/bench/bench/manualseats/mapping/",
+        {"cat-Category 0": product.pk},
+    )
+    assert response.status_code == 302
+    with scope(organizer=small.organizer):
+        assert products(small.event) == {product.pk}
+
+
+@pytest.mark.django_db
+def test_copy_mapping(small):
+    with scope(organizer=small.organizer):
+        SeatCategoryMapping.objects.create(
+            event=small.event, layout_category="Category 0", product=small.items[0]
+        )
+        event = small.add_event("next")
+        AssignmentCopier(small.event, event, "attendee_email").run(assignments=False)
+        assert products(event) == {event.items.get().pk}
@@ -0,0 +1,140 @@
+import csv
+import io
+import pytest
+from datetime import datetime, timedelta, timezone
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import CachedFile, Event, SeatCategoryMapping
+
+from pretix_manualseats import tasks, views
+
+
+def create_events(small, *slugs):
+    with scopes_disabled():
+        return [
+            Event.objects.create(
+                organizer=small.organizer,
+                name=slug,
+                slug=slug,
+                date_from=datetime(2030, 2, 1, tzinfo=timezone.utc),
+                plugins="pretix_manualseats",
+            )
+            for slug in slugs
+        ]
+
+
+def apply_to_events(small, events, template=None):
+    report = CachedFile.objects.create(
+        expires=now() + timedelta(days=1),
+        date=now(),
+        filename=tasks.EVENTS_REPORT,
+        type="text/csv",
+    )
+    result = tasks.apply_to_events.apply(
+        kwargs={
+            "organizer": small.organizer.pk,
+            "user": None,
+            "plan": small.plan.pk,
+            "events": [e.pk for e in events],
+            "template": template.pk if template else None,
+            "locale": "en",
+            "report": str(report.pk),
+        }
+    ).get()
+    report.refresh_from_db()
+    report.file.open("r")
+    return result, list(csv.reader(io.StringIO(report.file.read())))
+
+
+@pytest.mark.django_db
+def test_apply_to_events_failure(small, monkeypatch):
+    events = create_events(small, "good", "bad")
+    apply_seating_plan = tasks.apply_seating_plan
+
+    def apply(event, plan):
+        if event.slug == "bad":
+            raise RuntimeError()
+        return apply_seating_plan(event, plan)
+
+    monkeypatch.setattr(tasks, "apply_seating_plan", apply)
+    result, rows = apply_to_events(small, events)
+    assert result["applied"] == 1
+    assert result["failed"] == 1
+    assert [row[:3] for row in rows[1:]] == [
+        ["good", "good", "applied"],
+        ["bad", "bad", "failed"],
+    ]
+
+
+@pytest.mark.django_db
+def test_apply_to_events_template(small):
+    (event,) = create_events(small, "next")
+    with scopes_disabled():
+        SeatCategoryMapping.objects.create(
+            event=small.event, layout_category="Category 0", product=small.items[0]
+        )
+        item = event.items.create(name="Product 0", default_price=10)
+    result, rows = apply_to_events(small, [event], small.event)
+    assert result["applied"] == 1
+    with scopes_disabled():
+        assert set(event.seats.values_list("product_id", flat=True)) == {item.pk}
+
+
+@pytest.mark.django_db
+def test_setup_subevents_failure(small, monkeypatch):
+    with scopes_disabled():
+        subevents = [
+            small.event.subevents.create(
+                name=name, date_from=datetime(2030, 1, 2, tzinfo=timezone.utc)
+            )
+            for name in ("good", "bad", "later")
+        ]
+    apply_subevent_seating_plan = tasks.apply_subevent_seating_plan
+
+    def apply(subevent, plan, mapping):
+        if str(subevent.name) == "bad":
+            raise RuntimeError()
+        return apply_subevent_seating_plan(subevent, plan, mapping)
+
+    monkeypatch.setattr(tasks, "apply_subevent_seating_plan", apply)
+    result = tasks.setup_subevents.apply(
+        kwargs={
+            "event": small.event.pk,
+            "plan": small.plan.pk,
+            "subevents": [s.pk for s in subevents],
+            "copy_mapping": False,
+            "locale": "en",
+        }
+    ).get()
+    assert result["total"] == 3
+    assert len(result["failed"]) == 1
+    assert result["failed"][0].startswith("bad")
+    with scopes_disabled():
+        assert subevents[2].seats.count() == small.size
+
+
+@pytest.mark.django_db
+def test_apply_progress(client, small, settings, monkeypatch):
+    class Result:
+        state = "PROGRESS"
+        info = {"value": 50, "rows": 1, "total": 2, "errors": 0}
+
+        def __init__(self, async_id):
+            pass
+
+        def ready(self):
+            return False
+
+    settings.HAS_CELERY = True
+    monkeypatch.setattr(views, "AsyncResult", Result)
+    client.login(email="bench@example.org", password="bench")
+    response = client.get(
+        "/control/organizer/bench/manualseats/{}/apply?async_id=abc".format(
+            small.plan.pk
+        )
+    )
+    assert response.status_code == 200
+    content = response.content.decode()
+    assert "Events processed" in content
+    assert "1 / 2" in content
+    assert small.plan.name in content